@@ -0,0 +1,52 @@
+"""Compares the pure-Python and accelerated decode paths on large synthetic configuration.
+
+Run from the repository root:
+
+    python benchmarks/decode.py [--routes N] [--repeat N]
+
+The accelerated path needs the optional orjson package (pip install platformshconfig[speedups]).
+"""
+
+import os
+import sys
+import timeit
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from platformshconfig import config as config_module  # noqa: E402
+from platformshconfig.testing import encode, generate_sections  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--routes', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    backends = [('json', config_module._json_loads_stdlib)]
+    if config_module.orjson is not None:
+        backends.append(('orjson', config_module._json_loads_orjson))
+    else:
+        print('orjson is not installed; only the pure-Python path is measured.')
+
+    sections = generate_sections(routes=args.routes, application_depth=args.routes // 50, seed=0)
+    blobs = [
+        ('routes', encode(sections['routes'])),
+        ('application', encode(sections['application'])),
+    ]
+
+    print('{:<12} {:>12} {:<8} {:>10}'.format('section', 'bytes', 'backend', 'ms'))
+    original = config_module._json_loads
+    try:
+        for section, blob in blobs:
+            for backend, loads in backends:
+                config_module._json_loads = loads
+                best = min(timeit.repeat(lambda: config_module.Config.decode(blob), number=1, repeat=args.repeat))
+                print('{:<12} {:>12} {:<8} {:>10.2f}'.format(section, len(blob), backend, best * 1000))
+    finally:
+        config_module._json_loads = original
+
+
+if __name__ == '__main__':
+    main()
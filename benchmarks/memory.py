@@ -0,0 +1,36 @@
+"""Measures the memory saved by deduplicating route sub-objects on a large synthetic routes definition.
+
+Run from the repository root:
+
+    python benchmarks/memory.py [--routes N]
+"""
+
+import os
+import sys
+import json
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from platformshconfig import Config  # noqa: E402
+from platformshconfig.config import _deep_size  # noqa: E402
+from platformshconfig.testing import encode, generate_sections  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--routes', type=int, default=5000)
+    args = parser.parse_args()
+
+    routes = generate_sections(routes=args.routes, seed=0)['routes']
+    plain = _deep_size(json.loads(json.dumps(routes)), set())
+    shared = Config({'PLATFORM_ROUTES': encode(routes)}).memory_report()['sections']['routes']['bytes']
+
+    print('routes:   {}'.format(args.routes))
+    print('plain:    {:>12} bytes'.format(plain))
+    print('shared:   {:>12} bytes'.format(shared))
+    print('saved:    {:>12} bytes ({:.0%})'.format(plain - shared, 1 - float(shared) / plain))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Checks that Config construction scales linearly with the size of the environment, and lookups do not scale.
+
+Run from the repository root:
+
+    python benchmarks/scaling.py [--base N] [--factor N]
+
+Environments of `base` and `base * factor` routes, relationships replicas and variables are generated. The script
+exits with a non-zero status if construction time grows more than twice as fast as the size, or if lookups
+(get_route, credentials, variable, variables_ns) get more than twice as slow on the larger environment.
+"""
+
+import os
+import sys
+import timeit
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from platformshconfig import Config  # noqa: E402
+from platformshconfig.testing import generate_environment  # noqa: E402
+
+LOOKUPS = 2000
+
+
+def measure(size, repeat):
+    env = generate_environment(routes=size, replicas=max(1, size // 100), variables=size, application_depth=10,
+                               seed=size)
+    construction = min(timeit.repeat(lambda: Config(env), number=1, repeat=repeat))
+
+    config = Config(env)
+    route_id = 'route{}'.format(size - size % 3 - 3 if size > 3 else 0)
+    variable = 'env:var{}'.format(size - size % 5 - 5 if size > 5 else 0)
+    config.get_route(route_id)
+    config.variables_ns('django')
+    lookups = {
+        'get_route': lambda: config.get_route(route_id),
+        'credentials': lambda: config.credentials('database', 0),
+        'variable': lambda: config.variable(variable),
+        'variables_ns': lambda: config.variables_ns('django'),
+    }
+    per_lookup = {name: min(timeit.repeat(function, number=LOOKUPS, repeat=repeat)) / LOOKUPS
+                  for name, function in lookups.items()}
+    return construction, per_lookup
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--base', type=int, default=500)
+    parser.add_argument('--factor', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    small, large = args.base, args.base * args.factor
+    small_construction, small_lookups = measure(small, args.repeat)
+    large_construction, large_lookups = measure(large, args.repeat)
+
+    failures = []
+    ratio = large_construction / small_construction
+    print('construction  {:>8} -> {:>8}: {:8.2f} ms -> {:8.2f} ms (x{:.1f} for x{} size)'.format(
+        small, large, small_construction * 1000, large_construction * 1000, ratio, args.factor))
+    if ratio > 2 * args.factor:
+        failures.append('construction')
+
+    for name in sorted(small_lookups):
+        ratio = large_lookups[name] / small_lookups[name]
+        print('{:<13} {:>8} -> {:>8}: {:8.3f} us -> {:8.3f} us (x{:.1f})'.format(
+            name, small, large, small_lookups[name] * 1e6, large_lookups[name] * 1e6, ratio))
+        if ratio > 2:
+            failures.append(name)
+
+    if failures:
+        print('Not scaling as expected: {}'.format(', '.join(failures)))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
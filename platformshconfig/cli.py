@@ -0,0 +1,147 @@
+"""Command-line access to the decoded Platform.sh configuration.
+
+Usage:
+
+    platformshconfig routes
+    platformshconfig credentials database --formatter postgresql_dsn
+    platformshconfig --timing
+
+"""
+
+import sys
+import json
+import time
+import argparse
+
+from .config import (Config, BuildTimeVariableAccessException, ConfigDecodeException,
+                     NoCredentialFormatterFoundException, NotValidPlatformException, SectionNotLoadedException)
+
+
+def build_parser():
+    """Builds the argument parser for the command-line tool.
+
+    Returns:
+        argparse.ArgumentParser
+
+    """
+
+    parser = argparse.ArgumentParser(
+        prog='platformshconfig',
+        description='Inspect the Platform.sh configuration of the current environment.'
+    )
+    parser.add_argument('--prefix', default='PLATFORM_',
+                        help="The prefix for environment variables. Defaults to 'PLATFORM_'.")
+    parser.add_argument('--compact', action='store_true', help='Print JSON on a single line.')
+    parser.add_argument('--timing', action='store_true',
+                        help='Report decode time and size per section (on stderr if a command is also given).')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Number of decode runs per section for --timing; the best one is reported.')
+
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    for section in sorted(Config._encodedVariables):
+        commands.add_parser(section, help='Dump the decoded {} as JSON.'.format(section))
+
+    credentials = commands.add_parser('credentials', help='Dump the credentials of a relationship.')
+    credentials.add_argument('relationship')
+    credentials.add_argument('--index', type=int, default=0, help='The index within the relationship.')
+    credentials.add_argument('--formatter', help='Format the credentials with a registered formatter.')
+
+    return parser
+
+
+def timing_report(config, repeat=5):
+    """Measures how long each encoded section takes to decode.
+
+    Args:
+        config (Config):
+            The configuration whose environment is measured.
+        repeat (int):
+            Number of decode runs per section; the fastest is reported.
+
+    Returns:
+        A list of dicts with the keys 'section', 'variable', 'encoded_bytes', 'json_bytes' and 'seconds', one per
+        section that is defined.
+
+    """
+
+    report = []
+    for section in sorted(config._encodedVariables):
+        name = config._varPrefix + config._encodedVariables[section]
+        raw = config._encodedValues[section]
+        if not raw:
+            continue
+        best = None
+        for _ in range(max(1, repeat)):
+            start = time.perf_counter()
+            Config.decode(raw, name)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        report.append({
+            'section': section,
+            'variable': name,
+            'encoded_bytes': len(raw),
+            'json_bytes': len(json.dumps(getattr(config, config._sectionAttributes[section]), separators=(',', ':'))),
+            'seconds': best,
+        })
+    return report
+
+
+def _format_timing(report):
+    lines = ['{:<14} {:>14} {:>12} {:>12}'.format('section', 'encoded bytes', 'json bytes', 'decode ms')]
+    for row in report:
+        lines.append('{:<14} {:>14} {:>12} {:>12.3f}'.format(
+            row['section'], row['encoded_bytes'], row['json_bytes'], row['seconds'] * 1000))
+    return '\n'.join(lines) + '\n'
+
+
+def main(argv=None, environ=None, stdout=None, stderr=None):
+    """Runs the command-line tool.
+
+    Args:
+        argv (list|None):
+            The arguments, without the program name. Defaults to sys.argv[1:].
+        environ (dict|None):
+            The environment variables to read. Defaults to the current environment.
+        stdout, stderr (file|None):
+            Where to write output and errors. Default to sys.stdout and sys.stderr.
+
+    Returns:
+        int: The exit status.
+
+    """
+
+    stdout = sys.stdout if stdout is None else stdout
+    stderr = sys.stderr if stderr is None else stderr
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if not args.command and not args.timing:
+        parser.print_help(stderr)
+        return 2
+
+    try:
+        config = Config(environ, args.prefix)
+
+        if args.command == 'credentials':
+            if args.formatter:
+                value = config.formatted_credentials(args.relationship, args.formatter, args.index)
+            else:
+                value = config.credentials(args.relationship, args.index)
+        elif args.command:
+            value = getattr(config, args.command)()
+
+        if args.command:
+            if isinstance(value, str):
+                stdout.write(value + '\n')
+            else:
+                json.dump(value, stdout, indent=None if args.compact else 2, sort_keys=not args.compact)
+                stdout.write('\n')
+
+        if args.timing:
+            (stderr if args.command else stdout).write(_format_timing(timing_report(config, args.repeat)))
+    except (KeyError, BuildTimeVariableAccessException, ConfigDecodeException, NoCredentialFormatterFoundException,
+            NotValidPlatformException, SectionNotLoadedException) as e:
+        stderr.write('platformshconfig: {}\n'.format(e.args[0] if isinstance(e, KeyError) and e.args else e))
+        return 1
+
+    return 0
@@ -1,16 +1,81 @@
 import os
+import re
 import sys
 import json
 import base64
+import hashlib
+import binascii
+import time
+import random
+import socket
+import logging
+import itertools
+import types
+import weakref
+import collections
+import collections.abc
+
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from urllib.parse import quote
+except ImportError:  # pragma: no cover
+    from urllib import quote
 
 __all__ = [
     "Config",
+    "ConfigLayer",
+    "Credentials",
+    "read_env_file",
+    "PlatformState",
+    "PoolSizing",
+    "ProbeResult",
+    "SectionDiff",
     "BuildTimeVariableAccessException",
+    "ConfigDecodeException",
     "NoCredentialFormatterFoundException",
-    "NotValidPlatformException"
+    "NotValidPlatformException",
+    "SectionNotLoadedException"
 
 ]
 
+logger = logging.getLogger(__name__)
+
+"""
+Where the code is running, as read from the environment by Config.refresh(). valid is True on Platform.sh (or with
+a local copy of its environment variables), build and runtime tell the phase, dedicated is True on a Dedicated
+environment and production on its production branch.
+"""
+PlatformState = collections.namedtuple('PlatformState', ['valid', 'build', 'runtime', 'dedicated', 'production'])
+
+"""
+The outcome of a TCP connection attempt to one relationship endpoint. latency is in seconds, and None if the
+endpoint was not reachable; error describes why.
+"""
+ProbeResult = collections.namedtuple('ProbeResult', ['relationship', 'index', 'host', 'port', 'reachable', 'latency',
+                                                     'error'])
+
+"""
+The changes to one section between two Config objects. added and removed map keys to values; changed maps keys to
+(old, new) pairs. Routes are keyed by route ID (or URL for routes without one), relationships by (name, index)
+and variables and application definition by top-level key.
+"""
+SectionDiff = collections.namedtuple('SectionDiff', ['added', 'removed', 'changed'])
+
+"""
+Suggested connection pool settings for one relationship. workers is the number of worker processes of the
+application and threads the number of threads per worker; pool_size is the suggested size of each worker's pool and
+total the connections all workers open with it. max_connections is the connection limit assumed for the service,
+or None if it has none worth sizing against.
+"""
+PoolSizing = collections.namedtuple('PoolSizing', ['relationship', 'workers', 'threads', 'pool_size', 'total',
+                                                   'max_connections'])
+
 
 class Config:
     """Reads Platform.sh configuration from environment variables.
@@ -89,11 +154,55 @@ class Config:
         "socket": "SOCKET"
     }
 
+    """
+    Variables without prefix that pool_sizing() reads, kept with those above when the object is pickled.
+    """
+    _unPrefixedVariablesSizing = frozenset(["WEB_CONCURRENCY"])
+
+    """
+    Local index of the base64-encoded JSON variables, by section. The key is the section name, the value is the
+    environment variable, minus prefix, that contains the encoded section.
+    """
+    _encodedVariables = {
+        "routes": "ROUTES",
+        "relationships": "RELATIONSHIPS",
+        "variables": "VARIABLES",
+        "application": "APPLICATION"
+    }
+
+    """
+    The attribute holding the decoded data of each encoded section.
+    """
+    _sectionAttributes = {
+        "routes": "_routesDef",
+        "relationships": "_relationshipsDef",
+        "variables": "_variablesDef",
+        "application": "_applicationDef"
+    }
+
+    """
+    The names of all encoded sections, and the ones this object decoded.
+    """
+    _allSections = frozenset(_encodedVariables)
+    _sections = _allSections
+
+    """
+    The default size, in bytes of encoded value, from which a section is decoded on the executor passed to the
+    constructor. See the parallel_threshold constructor argument.
+    """
+    _parallelDecodeThreshold = 1024 * 1024
+
     """
     A local copy of all environment variables as of when the object was initialized.
     """
     _environmentVariables = []
 
+    """
+    The raw value of each encoded section's environment variable, as of when the object was initialized, so that
+    sections decoded or fingerprinted later match the ones decoded at construction even if the environment changed.
+    """
+    _encodedValues = {}
+
     """
     The vendor prefix for all environment variables we care about.
     """
@@ -121,11 +230,81 @@ class Config:
     _applicationDef = {}
 
     """
-    A map of the registered credential formatters.  The key is the name, the value is a function.
+    A map of the registered credential formatters.  The key is the name, the value is a function. The built-in
+    formatters are shared by all instances; register_formatter() gives an instance its own copy.
     """
     _credentialFormatters = {}
 
-    def __init__(self, environment_variables=None, var_prefix='PLATFORM_'):
+    """
+    The built-in formatter used when formatted_credentials() is called without one. Services are matched on the
+    service type (without version) first, and on the relationship's scheme second.
+    """
+    _defaultFormattersByType = {
+        "mysql": "mysql",
+        "mariadb": "mysql",
+        "oracle-mysql": "mysql",
+        "postgresql": "postgresql_dsn",
+        "mongodb": "pymongo",
+        "redis": "redis",
+        "redis-persistent": "redis",
+        "memcached": "memcached",
+        "elasticsearch": "elasticsearch",
+        "opensearch": "elasticsearch",
+        "solr": "pysolr",
+        "rabbitmq": "amqp",
+        "kafka": "kafka"
+    }
+    _defaultFormattersByScheme = {
+        "mysql": "mysql",
+        "pgsql": "postgresql_dsn",
+        "mongodb": "pymongo",
+        "redis": "redis",
+        "memcached": "memcached",
+        "solr": "pysolr",
+        "amqp": "amqp",
+        "kafka": "kafka"
+    }
+
+    """
+    The CPUs and memory (in MB) of each application container size, with the default HIGH_CPU profile. Used by
+    pool_sizing() to estimate the number of workers.
+    """
+    _containerSizes = {
+        "S": (0.4, 128),
+        "M": (0.4, 288),
+        "L": (1.2, 480),
+        "XL": (2.5, 1024),
+        "2XL": (5.0, 2048),
+        "4XL": (10.0, 4096)
+    }
+
+    """
+    The connection limit pool_sizing() assumes for each service type, when none is given. These are conservative:
+    the real limit of a database service grows with its size. Services not listed are not sized against a limit.
+    """
+    _serviceConnectionLimits = {
+        "mysql": 100,
+        "mariadb": 100,
+        "oracle-mysql": 100,
+        "postgresql": 100,
+        "redis": 10000,
+        "redis-persistent": 10000,
+        "memcached": 1024
+    }
+
+    """
+    The sections add_layer() can layer values over.
+    """
+    _layeredSections = frozenset(["variables", "application"])
+
+    """
+    The share of a service's connection limit that pool_sizing() leaves to other clients: cron jobs, deploy hooks,
+    workers and administrative sessions.
+    """
+    _reservedConnectionShare = 0.2
+
+    def __init__(self, environment_variables=None, var_prefix='PLATFORM_', strict=True, sections=None,
+                 executor=None, parallel_threshold=None):
         """Constructs a ConfigReader object.
 
         Args:
@@ -133,28 +312,232 @@ class Config:
                 The environment variables to read. Defaults to the current environment. Defaults to None.
             var_prefix (string):
                 The prefix for environment variables. Defaults to 'PLATFORM_'.
+            strict (bool):
+                Whether a malformed encoded variable raises a ConfigDecodeException (the default) or is logged and
+                treated as undefined.
+            sections (iterable|None):
+                The encoded sections to decode: any of 'routes', 'relationships', 'variables' and 'application'.
+                The others are never read, and accessing them raises a SectionNotLoadedException. Defaults to all
+                of them.
+            executor (concurrent.futures.Executor|None):
+                If given, sections whose encoded value is at least parallel_threshold bytes long are decoded
+                concurrently on it, while the smaller ones are decoded on the calling thread. JSON parsing holds the
+                GIL, and a process pool has to pickle the decoded sections back, so measure with
+                benchmarks/parallel_decode.py before relying on it. Defaults to None (sequential).
+            parallel_threshold (int|None):
+                The size, in bytes of encoded value, from which a section is decoded on the executor. Defaults to
+                None, which uses 1 MiB.
+
+        Raises:
+            ConfigDecodeException:
+                If strict and one of the encoded variables is not valid base64-encoded JSON.
+            ValueError:
+                If an unknown section is requested.
 
         """
 
         self._environmentVariables = os.environ if environment_variables is None else environment_variables
         self._varPrefix = var_prefix
+        self._strict = strict
+        self._encodedValues = {section: self._environmentVariables.get(var_prefix + variable)
+                               for section, variable in self._encodedVariables.items()}
+        self._fingerprints = {}
+        self._layers = {}
+        self._reset_caches()
+        self.refresh()
+
+        if sections is None:
+            self._sections = self._allSections
+        else:
+            self._sections = frozenset(sections)
+            unknown = self._sections - self._allSections
+            if unknown:
+                raise ValueError('Unknown configuration section(s): {}'.format(', '.join(sorted(unknown))))
+
+        if parallel_threshold is None:
+            parallel_threshold = self._parallelDecodeThreshold
+        loaded = [section for section in sorted(self._sections) if self._encodedValues[section]]
+        pending = []
+        if executor is not None:
+            # Submit the large sections first, so they are decoded while the small ones are decoded here.
+            for section in loaded:
+                raw = self._encodedValues[section]
+                if len(raw) >= parallel_threshold:
+                    name = self._varPrefix + self._encodedVariables[section]
+                    pending.append((section, executor.submit(_decode_prepared, section, raw, name, strict)))
+        submitted = set(section for section, future in pending)
+        for section in loaded:
+            if section not in submitted:
+                setattr(self, self._sectionAttributes[section], self._decode_section(section))
+        for section, future in pending:
+            setattr(self, self._sectionAttributes[section], future.result())
+
+    def _reset_caches(self):
+        """Initializes the per-instance caches that are derived from the decoded state."""
+
+        self._compactPayloads = {}
+        self._formattedCredentials = {}
+        self._roundRobin = {}
+        self._probeCache = None
+        self._routeIndex = None
+        self._variableNamespaces = None
+
+    def __getstate__(self):
+        """Returns the compact state of the object, for pickling and copying.
+
+        The state holds the decoded sections rather than the encoded variables, so unpickling does not decode
+        anything, and only the environment variables this object can read rather than the whole environment.
+        Derived caches are left out. Formatters and layers added to this object are included, and must be
+        picklable.
+
+        Returns:
+            dict
+
+        """
+
+        loaded = set(self._varPrefix + self._encodedVariables[section] for section in self._sections)
+        unprefixed = set(self._unPrefixedVariablesRuntime.values()) | self._unPrefixedVariablesSizing
+        fingerprints = {section: self.fingerprint(section) for section in self._allSections}
+        fingerprints[None] = self.fingerprint()
+
+        state = {
+            'environment': {name: value for name, value in self._environmentVariables.items()
+                            if (name.startswith(self._varPrefix) and name not in loaded) or name in unprefixed},
+            'prefix': self._varPrefix,
+            'strict': self._strict,
+            'sections': sorted(self._sections),
+            'decoded': {section: getattr(self, self._sectionAttributes[section]) for section in self._sections},
+            'fingerprints': fingerprints,
+        }
+        if '_credentialFormatters' in self.__dict__:
+            state['formatters'] = self._credentialFormatters
+        if self._layers:
+            state['layers'] = {section: layered.layers() for section, layered in self._layers.items()}
+        return state
+
+    def __setstate__(self, state):
+        """Restores an object from the state returned by __getstate__(), without decoding anything.
+
+        Args:
+            state (dict)
+
+        """
+
+        self._environmentVariables = state['environment']
+        self._varPrefix = state['prefix']
+        self._encodedValues = {section: state['environment'].get(state['prefix'] + variable)
+                               for section, variable in self._encodedVariables.items()}
+        self._strict = state['strict']
+        self._sections = frozenset(state['sections'])
+        for section, decoded in state['decoded'].items():
+            setattr(self, self._sectionAttributes[section], decoded)
+        self._fingerprints = dict(state['fingerprints'])
+        if 'formatters' in state:
+            self._credentialFormatters = state['formatters']
+        self._reset_caches()
+        self._set_layers(state.get('layers', {}))
+        self.refresh()
+
+    def __reduce__(self):
+        return _restore_config, (self.__class__, self.__getstate__())
+
+    @classmethod
+    def minimal(cls, environment_variables=None, var_prefix='PLATFORM_'):
+        """Constructs a Config object that decodes none of the encoded sections.
+
+        Meant for small processes that only need the plain properties (port, socket, branch...) and the
+        environment checks, and should not pay for decoding routes, relationships, variables or the application.
+
+        Args:
+            environment_variables (dict):
+                The environment variables to read. Defaults to the current environment. Defaults to None.
+            var_prefix (string):
+                The prefix for environment variables. Defaults to 'PLATFORM_'.
+
+        Returns:
+            Config
+
+        """
+
+        return cls(environment_variables, var_prefix, sections=())
 
-        if self['ROUTES']:
-            routes = self['ROUTES']
-            self._routesDef = self.decode(routes)
-        if self['RELATIONSHIPS']:
-            relationships = self['RELATIONSHIPS']
-            self._relationshipsDef = self.decode(relationships)
-            self.register_formatter('pymongo', pymongo_formatter)
-            self.register_formatter('pysolr', pysolr_formatter)
-            self.register_formatter('postgresql_dsn', posgresql_dsn_formatter)
-
-        if self['VARIABLES']:
-            variables = self['VARIABLES']
-            self._variablesDef = self.decode(variables)
-        if self['APPLICATION']:
-            application = self['APPLICATION']
-            self._applicationDef = self.decode(application)
+    @classmethod
+    def from_env_file(cls, path, var_prefix='PLATFORM_', **kwargs):
+        """Constructs a Config object from a file of environment variables, for instance for local development.
+
+        The file has one NAME=value assignment per line, as written by `env` or used by Docker and dotenv. Blank
+        lines and lines starting with # are ignored, an `export ` prefix is allowed, and values may be quoted.
+
+        Args:
+            path (string):
+                The path of the file.
+            var_prefix (string):
+                The prefix for environment variables. Defaults to 'PLATFORM_'.
+            **kwargs:
+                Other arguments of the constructor (strict, sections...).
+
+        Returns:
+            Config
+
+        """
+
+        return cls(read_env_file(path), var_prefix, **kwargs)
+
+    def reload(self, environment_variables=None):
+        """Constructs a Config object for an updated environment, decoding only the sections that changed.
+
+        Sections whose encoded variable is unchanged (see fingerprint()) are shared with this object rather than
+        decoded again; treat them as read-only. The new object loads the same sections as this one, and keeps the
+        formatters registered and the layers added on it.
+
+        Args:
+            environment_variables (dict):
+                The new environment variables. Defaults to the current environment. Defaults to None.
+
+        Returns:
+            Config
+
+        """
+
+        other = self.__class__(environment_variables, self._varPrefix, self._strict, sections=())
+        other._sections = self._sections
+        for section in sorted(self._sections):
+            attribute = self._sectionAttributes[section]
+            if other.fingerprint(section) == self.fingerprint(section):
+                setattr(other, attribute, getattr(self, attribute))
+                if section == 'variables':
+                    other._variableNamespaces = self._variableNamespaces
+            elif other[self._encodedVariables[section]]:
+                setattr(other, attribute, other._decode_section(section))
+        if '_credentialFormatters' in self.__dict__:
+            other._credentialFormatters = dict(self._credentialFormatters)
+        other._set_layers({section: layered.layers() for section, layered in self._layers.items()})
+        return other
+
+    def refresh(self):
+        """Reads the platform state (see platform_state) from the environment again.
+
+        The state is read once when the object is constructed, so the environment checks are plain attribute reads.
+        Call this if the environment variables changed since.
+
+        Returns:
+            PlatformState: The new state.
+
+        """
+
+        valid = 'APPLICATION_NAME' in self
+        environment = self['ENVIRONMENT']
+        dedicated = valid and self['MODE'] == 'enterprise'
+        production = valid and self['BRANCH'] == ('production' if dedicated else 'master')
+        self._platformState = PlatformState(valid, valid and not environment, valid and bool(environment), dedicated,
+                                            production)
+        return self._platformState
+
+    @property
+    def platform_state(self):
+        """PlatformState: Where the code is running, as of construction or the last call to refresh()."""
+
+        return self._platformState
 
     def is_valid_platform(self):
         """Checks whether the code is running on a platform with valid environment variables.
@@ -165,7 +548,7 @@ class Config:
 
         """
 
-        return 'APPLICATION_NAME' in self
+        return self._platformState.valid
 
     def in_build(self):
         """Checks whether the code is running in a build environment.
@@ -175,7 +558,7 @@ class Config:
 
         """
 
-        return self.is_valid_platform() and not self['ENVIRONMENT']
+        return self._platformState.build
 
     def in_runtime(self):
         """Checks whether the code is running in a runtime environment.
@@ -184,7 +567,7 @@ class Config:
             bool: True if in a runtime environment, False otherwise.
         """
 
-        return self.is_valid_platform() and self['ENVIRONMENT']
+        return self._platformState.runtime
 
     def credentials(self, relationship, index=0):
         """Retrieves the credentials for accessing a relationship.
@@ -193,10 +576,12 @@ class Config:
             relationship (string):
                 The relationship name as defined in .platform.app.yaml
             index (int):
-                The index within the relationship to access. This is always 0, but reserved for future extension.
+                The index within the relationship to access. Replicated services expose one entry per endpoint;
+                see all_credentials() and select_credentials(). Defaults to 0.
 
         Returns:
-            The credentials dict for the service pointed to by the relationship.
+            The credentials dict (a Credentials object, whose repr() hides the password) for the service pointed to
+            by the relationship.
 
         Raises:
             RuntimeError:
@@ -206,6 +591,51 @@ class Config:
 
         """
 
+        endpoints = self.all_credentials(relationship)
+        if not 0 <= index < len(endpoints):
+            raise KeyError('No index {} defined for relationship: {}.  '
+                             'Check your .platform.app.yaml file.'.format(
+                                 index, relationship))
+        return endpoints[index]
+
+    def all_credentials(self, relationship):
+        """Retrieves the credentials of every endpoint of a relationship.
+
+        Args:
+            relationship (string):
+                The relationship name as defined in .platform.app.yaml
+
+        Returns:
+            The list of credentials dicts for the relationship, in index order.
+
+        Raises:
+            RuntimeError:
+                Thrown if called in a context that has no relationships (eg, in build).
+            KeyError:
+                Thrown if the relationship does not exist.
+
+        """
+
+        relationships = self.relationships()
+        if not self.has_relationship(relationship):
+            raise KeyError(
+                'No relationship defined: {}. Check your .platform.app.yaml file.'
+                .format(relationship))
+        return relationships[relationship]
+
+    def relationships(self):
+        """Returns the relationships definition.
+
+        Returns:
+            The dict of relationship names to lists of credentials dicts.
+
+        Raises:
+            RuntimeError:
+                Thrown if called in a context that has no relationships (eg, in build).
+
+        """
+
+        self._require('relationships')
         if not self._relationshipsDef:
             if self.in_build():
                 raise BuildTimeVariableAccessException(
@@ -216,16 +646,181 @@ class Config:
                 If you're running on your local system you may need to create a tunnel
                  to access your environment services.  See https://docs.platform.sh/gettingstarted/local/tethered.html"""
             )
+        return self._relationshipsDef
 
-        if not self.has_relationship(relationship):
-            raise KeyError(
-                'No relationship defined: {}. Check your .platform.app.yaml file.'
-                .format(relationship))
-        if index >= len(self._relationshipsDef):
-            raise KeyError('No index {} defined for relationship: {}.  '
-                             'Check your .platform.app.yaml file.'.format(
-                                 index, relationship))
-        return self._relationshipsDef[relationship][index]
+    def select_credentials(self, relationship, strategy='round-robin'):
+        """Picks one endpoint of a relationship, to spread connections across the replicas of a service.
+
+        Args:
+            relationship (string):
+                The relationship name as defined in .platform.app.yaml
+            strategy (string):
+                'round-robin' cycles through the endpoints on successive calls, 'random' picks one at random and
+                'master' returns the first endpoint flagged `is_master` in its query (or the first endpoint if none
+                is). Defaults to 'round-robin'.
+
+        Returns:
+            The credentials dict of the selected endpoint.
+
+        Raises:
+            KeyError:
+                Thrown if the relationship does not exist, or has no endpoints.
+            ValueError:
+                Thrown if the strategy is unknown.
+
+        """
+
+        endpoints = self.all_credentials(relationship)
+        if not endpoints:
+            raise KeyError('No index 0 defined for relationship: {}.  '
+                           'Check your .platform.app.yaml file.'.format(relationship))
+        if strategy == 'round-robin':
+            counter = self._roundRobin.get(relationship)
+            if counter is None:
+                counter = self._roundRobin.setdefault(relationship, itertools.count())
+            return endpoints[next(counter) % len(endpoints)]
+        if strategy == 'random':
+            return random.choice(endpoints)
+        if strategy == 'master':
+            for endpoint in endpoints:
+                if (endpoint.get('query') or {}).get('is_master'):
+                    return endpoint
+            return endpoints[0]
+        raise ValueError('Unknown endpoint selection strategy: {}'.format(strategy))
+
+    def probe_relationships(self, relationships=None, timeout=1.0, concurrency=8, max_age=5.0):
+        """Checks which relationship endpoints accept TCP connections, and how quickly.
+
+        Every endpoint is probed concurrently, so a service that is still starting up costs at most `timeout`
+        rather than one timeout per endpoint. Results are cached for `max_age` seconds.
+
+        Args:
+            relationships (iterable|None):
+                The relationships to probe. Defaults to all of them.
+            timeout (float):
+                The connection timeout per endpoint, in seconds. Defaults to 1.0.
+            concurrency (int):
+                The maximum number of simultaneous connection attempts. Defaults to 8.
+            max_age (float):
+                How long a previous result may be reused, in seconds. 0 always probes again. Defaults to 5.0.
+
+        Returns:
+            A dict of relationship names to lists of ProbeResult, in index order.
+
+        Raises:
+            RuntimeError:
+                Thrown if called in a context that has no relationships (eg, in build).
+            KeyError:
+                Thrown if one of the relationships does not exist.
+
+        """
+
+        self._require('relationships')
+        names = sorted(self._relationshipsDef) if relationships is None else list(relationships)
+        endpoints = [(name, index, endpoint) for name in names
+                     for index, endpoint in enumerate(self.all_credentials(name))]
+
+        key = (tuple(names), timeout)
+        cached = self._probeCache
+        if cached is not None and cached[0] == key and time.monotonic() - cached[1] < max_age:
+            return cached[2]
+
+        results = collections.OrderedDict((name, []) for name in names)
+        if endpoints:
+            with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(endpoints)))) as executor:
+                for result in executor.map(lambda args: _probe(*args, timeout=timeout), endpoints):
+                    results[result.relationship].append(result)
+
+        self._probeCache = (key, time.monotonic(), results)
+        return results
+
+    def pool_sizing(self, relationship, workers=None, threads=None, max_connections=None):
+        """Suggests how many connections each worker should keep open to a relationship.
+
+        Every worker process opens its own pool, so the pools of all workers together must stay within the
+        service's connection limit, less a share left to cron jobs, hooks and other clients. Each worker needs at
+        most one connection per thread.
+
+        When not given, the number of workers and threads is read from the application's start command
+        (--workers and --threads, uWSGI's --processes, or the WEB_CONCURRENCY environment variable); values that
+        are zero or not numbers are ignored. Failing that, PHP applications use as many workers as PHP-FPM would
+        start from the container memory and the application's sizing hints, and other applications use
+        2 * CPUs + 1 workers of one thread. The container size is that of the application definition. With 'AUTO'
+        it is not known (the CPUs of the host say nothing about the container's share of them), so workers must be
+        given.
+
+        Args:
+            relationship (string):
+                The relationship name as defined in .platform.app.yaml
+            workers (int|None):
+                The number of worker processes. Defaults to None (derived from the application definition).
+            threads (int|None):
+                The number of threads per worker. Defaults to None (derived from the application definition).
+            max_connections (int|None):
+                The service's connection limit. Defaults to None, which uses _serviceConnectionLimits.
+
+        Returns:
+            PoolSizing: The suggested settings.
+
+        Raises:
+            RuntimeError:
+                Thrown if called in a context that has no relationships (eg, in build).
+            KeyError:
+                Thrown if the relationship does not exist.
+            ValueError:
+                Thrown if workers or threads is not a positive integer, or if workers is not given and cannot be
+                derived from the application definition.
+
+        """
+
+        service_type = (self.credentials(relationship).get('type') or '').split(':')[0]
+        application = self.application()
+        command = ((application.get('web') or {}).get('commands') or {}).get('start') or ''
+
+        for name, value in (('workers', workers), ('threads', threads)):
+            if value is not None and (not isinstance(value, int) or value < 1):
+                raise ValueError('{} must be a positive integer, not: {!r}'.format(name, value))
+
+        if workers is None:
+            options = ('--workers', '-w')
+            if _uwsgi_command.search(command):
+                options += ('--processes', '-p')
+            concurrency = self._environmentVariables.get('WEB_CONCURRENCY') or ''
+            workers = _command_option(command, options) or \
+                (int(concurrency) if concurrency.strip().isdigit() else 0) or \
+                self._default_workers(application)
+        if threads is None:
+            threads = _command_option(command, ('--threads',)) or 1
+        if max_connections is None:
+            max_connections = self._serviceConnectionLimits.get(service_type)
+
+        pool_size = threads
+        if max_connections is not None:
+            available = int(max_connections * (1 - self._reservedConnectionShare))
+            pool_size = max(1, min(threads, available // workers))
+            if pool_size * workers > available:
+                logger.warning('%d workers of %s exceed the %d connections available to %s', workers,
+                               application.get('name'), available, relationship)
+        return PoolSizing(relationship, workers, threads, pool_size, pool_size * workers, max_connections)
+
+    def _default_workers(self, application):
+        """Estimates the number of workers of an application from its container size and type.
+
+        Raises:
+            ValueError:
+                If the container size is 'AUTO' or unknown.
+
+        """
+
+        size = application.get('size')
+        if size not in self._containerSizes:
+            raise ValueError('The number of workers cannot be estimated for container size {}; pass workers to '
+                             'pool_sizing().'.format(size))
+        cpus, memory = self._containerSizes[size]
+        if (application.get('type') or '').startswith('php'):
+            hints = (application.get('runtime') or {}).get('sizing_hints') or {}
+            return max(1, (memory - hints.get('reserved_memory', 70)) // hints.get('request_memory', 45))
+        return int(2 * cpus) + 1
 
     def variable(self, name, default=None):
         """Returns a variable from the VARIABLES dict.
@@ -246,6 +841,9 @@ class Config:
 
         """
 
+        self._require('variables')
+        if 'variables' in self._layers:
+            return self._layers['variables'].get(name, default)
         if not self._variablesDef:
             return default
         return self._variablesDef.get(name, default)
@@ -258,11 +856,44 @@ class Config:
         It's valid for there to be no variables defined at all, so there's no guard for missing values.
 
         Returns:
-            The full variables dict.
+            The full variables dict. If layers were added (see add_layer()), it holds the resolved values and is
+            built again only when a layer changes; layered() returns a view that is not copied.
 
         """
+        self._require('variables')
+        if 'variables' in self._layers:
+            return self._layers['variables'].to_dict()
         return self._variablesDef
 
+    def variables_ns(self, namespace):
+        """Returns the variables of one namespace.
+
+        Variable names are namespaced with a colon, as in `django:secret_key` or `env:FOO`. The variables are
+        grouped by namespace once, the first time this is called, so later calls do not depend on the number of
+        variables.
+
+        Args:
+            namespace (string):
+                The namespace, without the colon. The empty string returns the variables without a namespace.
+
+        Returns:
+            A read-only mapping of the variable names, without the namespace, to their values. It is empty if no
+            variable is in the namespace.
+
+        """
+
+        self._require('variables')
+        if self._variableNamespaces is None:
+            namespaces = {}
+            for name, value in (self.variables() or {}).items():
+                namespace_name, separator, short_name = name.partition(':')
+                if not separator:
+                    namespace_name, short_name = '', name
+                namespaces.setdefault(namespace_name, {})[short_name] = value
+            self._variableNamespaces = {name: types.MappingProxyType(variables)
+                                        for name, variables in namespaces.items()}
+        return self._variableNamespaces.get(namespace, _empty_namespace)
+
     def routes(self):
         """Return the routes definition.
 
@@ -274,6 +905,7 @@ class Config:
                 If the routes are not accessible due to being in the wrong environment.
 
         """
+        self._require('routes')
         if self.in_build():
             raise BuildTimeVariableAccessException(
                 'Routes are not available during the build phase.'
@@ -348,16 +980,25 @@ class Config:
 
         """
 
+        self._require('routes')
         if not self._routesDef:
             raise NotValidPlatformException(
                 'No routes are defined.  Are you sure you are running on Platform.sh?'
             )
 
-        for (url, route) in self.routes().items():
-            if route['id'] == route_id:
-                route['url'] = url
-                return route
-        raise KeyError('No such route id found: {}'.format(route_id))
+        routes = self.routes()
+        if self._routeIndex is None:
+            index = {}
+            for (url, route) in routes.items():
+                index.setdefault(route.get('id'), url)
+            self._routeIndex = index
+
+        if route_id not in self._routeIndex:
+            raise KeyError('No such route id found: {}'.format(route_id))
+        url = self._routeIndex[route_id]
+        route = routes[url]
+        route['url'] = url
+        return route
 
     def application(self):
         """Returns the application definition dict.
@@ -366,16 +1007,128 @@ class Config:
         added by Platform.sh as part of the build and deploy process.
 
         Returns:
-            The application definition dict.
+            The application definition dict. If layers were added (see add_layer()), its top-level keys hold the
+            resolved values, and it is built again only when a layer changes.
 
         """
 
+        self._require('application')
+        if 'application' in self._layers:
+            return self._layers['application'].to_dict()
         if not self._applicationDef:
             raise NotValidPlatformException(
                 'No application definition is available.  Are you sure you are running on Platform.sh?'
             )
         return self._applicationDef
 
+    def layered(self, section='variables'):
+        """Returns a read-only view of the variables or the application definition and their layers.
+
+        Unlike variables() and application(), the view is not copied when a layer changes: each key is resolved
+        through the layers when it is first read, and cached until one of them changes.
+
+        Args:
+            section (string):
+                'variables' or 'application'. Defaults to 'variables'.
+
+        Returns:
+            collections.abc.Mapping: The view. It is not a dict, so convert it with dict() before serializing it.
+
+        Raises:
+            ValueError:
+                If the section cannot be layered.
+
+        """
+
+        if section not in self._layeredSections:
+            raise ValueError('Only the {} sections can be layered, not: {}'.format(
+                ' and '.join(sorted(self._layeredSections)), section))
+        self._require(section)
+        if section in self._layers:
+            return self._layers[section]
+        return _LayeredMapping(getattr(self, self._sectionAttributes[section]) or {})
+
+    def add_layer(self, layer, section='variables', default=False):
+        """Layers values over, or under, the variables or the application definition.
+
+        variables(), variable(), variables_ns(), application() and layered() then resolve keys through the layers
+        and the decoded section in order: override layers first, the most recently added first, then the decoded
+        section, then default layers in the order they were added. Application layers apply to top-level keys.
+        Resolved keys, and the dicts variables() and application() return, are cached until one of the layers
+        changes.
+
+        Layers do not change the environment, so they are not part of fingerprint(), diff() or to_env(). reload()
+        keeps them.
+
+        Args:
+            layer (ConfigLayer|dict):
+                The values. A ConfigLayer notifies this object when it is modified or reloaded; any other mapping
+                is copied into a new ConfigLayer.
+            section (string):
+                'variables' or 'application'. Defaults to 'variables'.
+            default (bool):
+                Whether the layer provides defaults, consulted after the decoded section, rather than overrides.
+                Defaults to False.
+
+        Returns:
+            ConfigLayer: The layer, to modify later.
+
+        Raises:
+            ValueError:
+                If the section cannot be layered.
+
+        """
+
+        if section not in self._layeredSections:
+            raise ValueError('Only the {} sections can be layered, not: {}'.format(
+                ' and '.join(sorted(self._layeredSections)), section))
+        self._require(section)
+        if not isinstance(layer, ConfigLayer):
+            layer = ConfigLayer(layer)
+
+        layered = self._layers.get(section)
+        if layered is None:
+            layered = self._layers[section] = _LayeredMapping(getattr(self, self._sectionAttributes[section]) or {})
+        if default:
+            layered.maps.append(layer)
+        else:
+            layered.maps.insert(0, layer)
+        layer._observers.add(self)
+        self._layers_changed()
+        return layer
+
+    def remove_layer(self, layer):
+        """Removes a layer added with add_layer() from every section.
+
+        Args:
+            layer (ConfigLayer)
+
+        """
+
+        for section, layered in list(self._layers.items()):
+            layered.maps[:] = [values for values in layered.maps if values is not layer]
+            if len(layered.maps) == 1:
+                del self._layers[section]
+        layer._observers.discard(self)
+        self._layers_changed()
+
+    def _set_layers(self, layers):
+        """Layers the given (overrides, defaults) pairs of layers over the sections they are keyed by."""
+
+        self._layers = {}
+        for section, (overrides, defaults) in layers.items():
+            self._layers[section] = _LayeredMapping(getattr(self, self._sectionAttributes[section]) or {}, overrides,
+                                                    defaults)
+            for layer in itertools.chain(overrides, defaults):
+                layer._observers.add(self)
+
+    def _layers_changed(self):
+        """Clears the values resolved from the layers. Called by the layers when they change."""
+
+        for layered in self._layers.values():
+            layered.invalidate()
+        self._variableNamespaces = None
+
     def on_dedicated(self):
         """Determines if the current environment is a Platform.sh Dedicated environment.
 
@@ -385,7 +1138,7 @@ class Config:
 
         """
 
-        return self.is_valid_platform() and self['MODE'] == 'enterprise'
+        return self._platformState.dedicated
 
     def on_enterprise(self):
         """Determines if the current environment is a Platform.sh Dedicated environment.
@@ -416,10 +1169,7 @@ class Config:
 
         """
 
-        if not self.is_valid_platform() and not self.in_build():
-            return False
-        prod_branch = 'production' if self.on_dedicated() else 'master'
-        return self['BRANCH'] == prod_branch
+        return self._platformState.production
 
     def register_formatter(self, name, formatter):
         """Adds a credential formatter to the configuration.
@@ -429,6 +1179,9 @@ class Config:
         database and format them into a URL string expected by pymongo. Use the formatted credentials() method to
         get the formatted  version of a particular relationship.
 
+        A formatter that needs every entry of a relationship (for instance to build a list of cluster members)
+        can set an `all_endpoints` attribute to True; it is then called with the list of credentials dicts.
+
         Args:
             name (string):
                 The name of the formatter. This may be an arbitrary alphanumeric string.
@@ -440,15 +1193,24 @@ class Config:
 
         """
 
+        if '_credentialFormatters' not in self.__dict__:
+            self._credentialFormatters = dict(self._credentialFormatters)
         self._credentialFormatters[name] = formatter
+        self._formattedCredentials = {}
         return self
 
-    def formatted_credentials(self, relationship, formatter):
+    def formatted_credentials(self, relationship, formatter=None, index=0):
         """Returns credentials for the specified relationship as formatted by the specified formatter.
 
+        Formatted credentials are computed once per relationship entry and formatter, and cached.
+
         Args:
             relationship (string):
-            formatter (string):
+            formatter (string|None):
+                The name of a registered formatter. Defaults to the built-in formatter matching the service type
+                or scheme of the relationship.
+            index (int):
+                The index within the relationship to format. Defaults to 0.
 
         Returns:
             The credentials formatted with the given formatter.
@@ -457,64 +1219,342 @@ class Config:
             NoCredentialFormatterFoundException
 
         """
-        if formatter not in self._credentialFormatters:
+        key = (formatter, relationship, index)
+        if key in self._formattedCredentials:
+            return self._formattedCredentials[key]
+
+        credentials = self.credentials(relationship, index)
+        name = formatter
+        if name is None:
+            name = self._default_formatter(credentials)
+            if name is None:
+                raise NoCredentialFormatterFoundException(
+                    'There is no default credential formatter for relationship {0} (type {1}, scheme {2}).'
+                    .format(relationship, credentials.get('type'), credentials.get('scheme'))
+                )
+        if name not in self._credentialFormatters:
             raise NoCredentialFormatterFoundException(
                 'There is no credential formatter named {0} registered. Did you remember to call register_formatter()?'
-                .format(formatter)
+                .format(name)
             )
-        return self._credentialFormatters[formatter](self.credentials(relationship))
 
+        format_function = self._credentialFormatters[name]
+        if getattr(format_function, 'all_endpoints', False):
+            credentials = self._relationshipsDef[relationship]
+        formatted = format_function(credentials)
+        self._formattedCredentials[(name, relationship, index)] = formatted
+        self._formattedCredentials[key] = formatted
+        return formatted
 
-    def has_relationship(self, relationship):
-        """Determines if a relationship is defined, and thus has credentials available.
+    def _default_formatter(self, credentials):
+        """Returns the name of the built-in formatter matching a relationship entry, or None."""
 
-        Args:
-            relationship (string):
-                The name of the relationship to check.
+        return self._defaultFormattersByType.get((credentials.get('type') or '').split(':')[0]) or \
+            self._defaultFormattersByScheme.get(credentials.get('scheme'))
 
-        Returns:
-            bool:
-                True if the relationship is defined, False otherwise.
+    def to_env(self, sections=None, relationships=None, compact=False):
+        """Returns the minimal environment a child process needs to construct its own Config object.
 
-        """
-        return relationship in self._relationshipsDef
+        Only the Platform.sh variables are included (the plain properties, PORT and SOCKET, and the encoded
+        sections that were asked for), so the result is meant to be merged into whatever base environment the child
+        is spawned with:
 
-    def __getitem__(self, item):
-        """Reads an environment variable, taking the variable prefix into account.
+            subprocess.Popen(cmd, env=dict(base_env, **config.to_env(sections=['relationships'])))
 
         Args:
-            item (string):
-                The variable to read.
+            sections (iterable|None):
+                The encoded sections to include: any of 'routes', 'relationships', 'variables' and 'application'.
+                Defaults to all of them.
+            relationships (iterable|None):
+                If given, only these relationships are passed on. Implies a re-encoded relationships section.
+            compact (bool):
+                Whether to re-encode the included sections from the already decoded data as compact JSON, rather
+                than passing on the original values. Defaults to False.
 
-        """
+        Returns:
+            A dict of environment variable names to string values.
 
-        check_name = self._varPrefix + item.upper()
+        Raises:
+            ValueError:
+                If an unknown section is requested.
 
-        return self._environmentVariables.get(check_name)
+        """
 
-    @staticmethod
-    def decode(variable):
-        """Decodes a Platform.sh environment variable.
+        sections = self._encodedVariables.keys() if sections is None else sections
+        unknown = set(sections) - set(self._encodedVariables)
+        if unknown:
+            raise ValueError('Unknown configuration section(s): {}'.format(', '.join(sorted(unknown))))
+
+        env = {}
+        for name in list(self._directVariables.values()) + list(self._directVariablesRuntime.values()) + ['MODE']:
+            value = self[name]
+            if value:
+                env[self._varPrefix + name] = value
+        for name in self._unPrefixedVariablesRuntime.values():
+            value = self._environmentVariables.get(name)
+            if value:
+                env[name] = value
+
+        for section in sections:
+            name = self._varPrefix + self._encodedVariables[section]
+            if section == 'relationships' and relationships is not None:
+                self._require('relationships')
+                value = _encode({rel: self._relationshipsDef[rel] for rel in relationships
+                                 if rel in self._relationshipsDef})
+            elif compact and getattr(self, self._sectionAttributes[section]):
+                value = self._compactPayloads.get(section)
+                if value is None:
+                    value = self._compactPayloads[section] = _encode(getattr(self, self._sectionAttributes[section]))
+            else:
+                value = self._encodedValues[section]
+                if not value:
+                    # Unpickled objects no longer hold the encoded form of the sections they decoded.
+                    if not getattr(self, self._sectionAttributes[section]):
+                        continue
+                    value = self._compactPayloads.get(section)
+                    if value is None:
+                        value = self._compactPayloads[section] = _encode(
+                            getattr(self, self._sectionAttributes[section]))
+            env[name] = value.decode('ascii') if isinstance(value, bytes) else value
+
+        return env
+
+    def fingerprint(self, section=None):
+        """Returns a digest of the encoded configuration, for use in cache keys and change detection.
+
+        The digest is computed from the raw environment variable as it was when this object was constructed, not
+        from the decoded data, so it is cheap and does not require the section to be loaded. Each digest is computed
+        once and cached.
 
         Args:
-            variable (string):
-                Base64-encoded JSON (the content of an environment variable).
+            section (string|None):
+                One of 'routes', 'relationships', 'variables' and 'application'. Defaults to None, which returns a
+                digest combining all four.
 
         Returns:
-            An dict (if representing a JSON object), or a scalar type.
+            (string) A hex SHA-256 digest. An undefined section has the digest of an empty value.
 
         Raises:
-            JSON decoding error.
+            ValueError:
+                If an unknown section is requested.
 
         """
 
-        try:
-            if sys.version_info[1] > 5:
-                return json.loads(base64.b64decode(variable))
-            else:
-                return json.loads(base64.b64decode(variable).decode('utf-8'))
-        except json.decoder.JSONDecodeError:
-            print('Error decoding JSON, code %d', json.decoder.JSONDecodeError)
+        digest = self._fingerprints.get(section)
+        if digest is not None:
+            return digest
+
+        if section is None:
+            combined = hashlib.sha256()
+            for name in sorted(self._allSections):
+                combined.update('{}={}\n'.format(name, self.fingerprint(name)).encode('ascii'))
+            digest = combined.hexdigest()
+        elif section in self._allSections:
+            raw = self._encodedValues[section] or b''
+            digest = hashlib.sha256(raw.encode('utf-8') if isinstance(raw, str) else raw).hexdigest()
+        else:
+            raise ValueError('Unknown configuration section: {}'.format(section))
+
+        self._fingerprints[section] = digest
+        return digest
+
+    def diff(self, other):
+        """Compares this configuration with another one, for instance the environment before and after a deploy.
+
+        Sections whose raw encoded variables are identical (see fingerprint()) are skipped without being compared.
+
+        Args:
+            other (Config):
+                The newer configuration.
+
+        Returns:
+            A dict of section names to SectionDiff, containing only the sections that changed. Empty if the two
+            configurations are equivalent.
+
+        """
+
+        changes = {}
+        for section in sorted(self._allSections):
+            if self.fingerprint(section) == other.fingerprint(section):
+                continue
+            old = _keyed_section(section, self._section_data(section))
+            new = _keyed_section(section, other._section_data(section))
+            changed = {key: (old[key], new[key]) for key in old.keys() & new.keys()
+                       if not _same_entry(section, old[key], new[key])}
+            added = {key: new[key] for key in new.keys() - old.keys()}
+            removed = {key: old[key] for key in old.keys() - new.keys()}
+            if added or removed or changed:
+                changes[section] = SectionDiff(added, removed, changed)
+        return changes
+
+    def _section_data(self, section):
+        """Returns the decoded data of a section, decoding it on the fly if this object did not load it."""
+
+        if section in self._sections:
+            return getattr(self, self._sectionAttributes[section])
+        return self._decode_section(section)
+
+    def _decode_section(self, section):
+        """Decodes an encoded section from the environment.
+
+        Routes are generated with the same tls, cache, http_access... blocks over and over, so their sub-objects
+        are deduplicated: structurally identical blocks (below the route level) become one shared object, and all
+        strings are interned.
+
+        Relationship entries are wrapped in Credentials objects.
+
+        Returns:
+            The decoded section, or an empty dict if it is undefined (or malformed, when not strict).
+
+        """
+
+        name = self._varPrefix + self._encodedVariables[section]
+        raw = self._encodedValues[section]
+        return self._prepare_section(section, self.decode(raw, name, self._strict) if raw else None)
+
+    @staticmethod
+    def _prepare_section(section, decoded):
+        """Turns the result of decode() into the stored form of a section. See _decode_section()."""
+
+        decoded = decoded or {}
+        if section == 'relationships' and isinstance(decoded, dict):
+            for endpoints in decoded.values():
+                for index, endpoint in enumerate(endpoints):
+                    if isinstance(endpoint, dict):
+                        endpoints[index] = Credentials(endpoint)
+        if section == 'routes' and isinstance(decoded, dict):
+            memo = {}
+            for url, route in decoded.items():
+                if isinstance(route, dict):
+                    for key, value in route.items():
+                        route[key] = _share(value, memo)
+        return decoded
+
+    def memory_report(self, top=5, intern=False):
+        """Reports how much memory the decoded sections use.
+
+        Sizes are deep sizes as measured by sys.getsizeof(), counting objects shared within a section once.
+
+        Args:
+            top (int):
+                The number of largest top-level entries to list per section (routes by URL, relationships,
+                variables and application keys by name). Defaults to 5.
+            intern (bool):
+                Whether to first intern every string value in the decoded sections (host names, URL templates,
+                scheme names...), so repeated values share one copy. This changes the decoded sections in place,
+                which are shared with the objects returned by reload(). Defaults to False.
+
+        Returns:
+            A dict with 'total' (bytes), 'sections' (a dict of section name to a dict with 'bytes' and 'largest', a
+            list of (key, bytes) pairs, largest first) and, if intern is True, 'saved' (bytes).
+
+        """
+
+        before = _deep_size([getattr(self, self._sectionAttributes[section]) for section in sorted(self._sections)],
+                            set()) if intern else None
+        if intern:
+            for section in self._sections:
+                _intern_strings(getattr(self, self._sectionAttributes[section]))
+
+        report = {'total': 0, 'sections': {}}
+        seen = set()
+        for section in sorted(self._sections):
+            data = getattr(self, self._sectionAttributes[section])
+            entries = sorted(((key, _deep_size(value, set())) for key, value in data.items()),
+                             key=lambda entry: entry[1], reverse=True)
+            report['sections'][section] = {'bytes': _deep_size(data, set()), 'largest': entries[:top]}
+            report['total'] += _deep_size(data, seen)
+
+        if intern:
+            report['saved'] = before - _deep_size(
+                [getattr(self, self._sectionAttributes[section]) for section in sorted(self._sections)], set())
+        return report
+
+    def has_relationship(self, relationship):
+        """Determines if a relationship is defined, and thus has credentials available.
+
+        Args:
+            relationship (string):
+                The name of the relationship to check.
+
+        Returns:
+            bool:
+                True if the relationship is defined, False otherwise.
+
+        """
+        self._require('relationships')
+        return relationship in self._relationshipsDef
+
+    def _require(self, section):
+        """Guards accessors of an encoded section against objects constructed without it.
+
+        Args:
+            section (string):
+                The section name.
+
+        Raises:
+            SectionNotLoadedException:
+                If the section was not decoded.
+
+        """
+
+        if section not in self._sections:
+            raise SectionNotLoadedException(
+                'The {} section was not loaded. Pass it in the sections argument of Config().'.format(section)
+            )
+
+    def __getitem__(self, item):
+        """Reads an environment variable, taking the variable prefix into account.
+
+        Args:
+            item (string):
+                The variable to read.
+
+        """
+
+        check_name = self._varPrefix + item.upper()
+
+        return self._environmentVariables.get(check_name)
+
+    @staticmethod
+    def decode(variable, name=None, strict=True):
+        """Decodes a Platform.sh environment variable.
+
+        The base64 layer is validated before any JSON parsing happens, so a truncated or corrupted value fails fast
+        without the cost of a partial JSON parse. If the optional orjson package is installed it parses the decoded
+        bytes directly, which is about twice as fast as the json module on large routes or application definitions.
+
+        Args:
+            variable (string):
+                Base64-encoded JSON (the content of an environment variable).
+            name (string):
+                The name of the environment variable, used in error messages. Defaults to None.
+            strict (bool):
+                Whether to raise on malformed input. If False, the error is logged and None is returned.
+                Defaults to True.
+
+        Returns:
+            An dict (if representing a JSON object), or a scalar type. None if decoding failed in lenient mode.
+
+        Raises:
+            ConfigDecodeException:
+                If strict and the value is not valid base64-encoded JSON.
+
+        """
+
+        try:
+            raw = _b64decode(variable, name)
+            try:
+                return _json_loads(raw)
+            except UnicodeDecodeError as e:
+                raise ConfigDecodeException(name, e.start, 'decoded value is not valid UTF-8')
+            except ValueError as e:
+                raise ConfigDecodeException(name, getattr(e, 'pos', None), 'invalid JSON: {}'.format(getattr(e, 'msg', e)))
+        except ConfigDecodeException as e:
+            if strict:
+                raise
+            logger.warning('Ignoring undecodable configuration: %s', e)
+            return None
 
     def __contains__(self, item):
         """Defines environment variable membership in Config.
@@ -551,6 +1591,11 @@ class Config:
 
         """
 
+        # Private and special names are never configuration properties. Failing fast also keeps copy and pickle,
+        # which probe for special methods on objects whose state is not restored yet, away from the lookup below.
+        if config_property.startswith('_'):
+            raise AttributeError(config_property)
+
         is_build_var = config_property in self._directVariables.keys()
         is_runtime_var = config_property in self._directVariablesRuntime.keys()
 
@@ -634,6 +1679,715 @@ def posgresql_dsn_formatter(credentials):
                                                      credentials["port"],
                                                      credentials["path"])
 
+class Credentials(dict):
+    """The credentials of one relationship endpoint.
+
+    A dict, as decoded from PLATFORM_RELATIONSHIPS, whose repr() hides secrets so it can be logged safely. The
+    redacted view is computed once and cached until the credentials are modified.
+
+    """
+
+    """
+    The keys whose values are hidden in the redacted view.
+    """
+    _secretKeys = frozenset(['password'])
+
+    _redacted = None
+    _repr = None
+
+    def to_dict(self, redact=False):
+        """Returns the credentials as a dict.
+
+        Args:
+            redact (bool):
+                Whether to mask secret values (the password). Defaults to False.
+
+        Returns:
+            This object itself if redact is False. Otherwise a cached redacted copy, shared between calls, which
+            must not be modified.
+
+        """
+
+        if not redact:
+            return self
+        if self._redacted is None:
+            self._redacted = {key: '******' if key in self._secretKeys and value is not None else value
+                              for key, value in self.items()}
+        return self._redacted
+
+    def __repr__(self):
+        if self._repr is None:
+            self._repr = 'Credentials({!r})'.format(self.to_dict(redact=True))
+        return self._repr
+
+    __str__ = __repr__
+
+    def __reduce__(self):
+        return self.__class__, (dict(self),)
+
+    def _invalidate(self):
+        self._redacted = None
+        self._repr = None
+
+    def __setitem__(self, key, value):
+        self._invalidate()
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        self._invalidate()
+        dict.__delitem__(self, key)
+
+    def clear(self):
+        self._invalidate()
+        dict.clear(self)
+
+    def pop(self, *args):
+        self._invalidate()
+        return dict.pop(self, *args)
+
+    def popitem(self):
+        self._invalidate()
+        return dict.popitem(self)
+
+    def setdefault(self, key, default=None):
+        self._invalidate()
+        return dict.setdefault(self, key, default)
+
+    def update(self, *args, **kwargs):
+        self._invalidate()
+        dict.update(self, *args, **kwargs)
+
+
+class ConfigLayer(dict):
+    """A dict of values layered over the variables or the application definition; see Config.add_layer().
+
+    Modifying the layer, or reloading it from its source, clears the values the Config objects using it resolved.
+
+    """
+
+    """
+    Where reload() reads the values from: None, ('file', path) or ('environment', prefix, environment_variables).
+    """
+    source = None
+
+    def __init__(self, *args, **kwargs):
+        dict.__init__(self, *args, **kwargs)
+        self._observers = weakref.WeakSet()
+
+    @classmethod
+    def from_file(cls, path):
+        """Reads a layer from a file: a JSON object if the name ends with '.json', environment variables otherwise.
+
+        Args:
+            path (string):
+                The file. See Config.from_env_file() for the format of environment variables.
+
+        Returns:
+            ConfigLayer
+
+        """
+
+        layer = cls()
+        layer.source = ('file', path)
+        dict.update(layer, layer._read())
+        return layer
+
+    @classmethod
+    def from_environment(cls, prefix, environment_variables=None):
+        """Reads a layer from the environment variables whose name starts with a prefix.
+
+        Args:
+            prefix (string):
+                The prefix, which is removed from the names: with 'APP_', APP_django:debug becomes django:debug.
+            environment_variables (dict):
+                The environment variables to read. Defaults to the current environment. Defaults to None.
+
+        Returns:
+            ConfigLayer
+
+        """
+
+        layer = cls()
+        layer.source = ('environment', prefix, environment_variables)
+        dict.update(layer, layer._read())
+        return layer
+
+    def reload(self):
+        """Reads the layer from its source again, if it has one, and notifies the Config objects using it."""
+
+        if self.source is not None:
+            values = self._read()
+            dict.clear(self)
+            dict.update(self, values)
+            self._changed()
+
+    def _read(self):
+        if self.source[0] == 'file':
+            path = self.source[1]
+            if path.endswith('.json'):
+                with open(path, 'r') as layer_file:
+                    return json.load(layer_file)
+            return read_env_file(path)
+        prefix, environment_variables = self.source[1:]
+        environment_variables = os.environ if environment_variables is None else environment_variables
+        return {name[len(prefix):]: value for name, value in environment_variables.items()
+                if name.startswith(prefix)}
+
+    def __reduce__(self):
+        return _restore_layer, (self.__class__, dict(self), self.source)
+
+    def _changed(self):
+        for observer in list(self._observers):
+            observer._layers_changed()
+
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, key, value)
+        self._changed()
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self._changed()
+
+    def clear(self):
+        dict.clear(self)
+        self._changed()
+
+    def pop(self, *args):
+        value = dict.pop(self, *args)
+        self._changed()
+        return value
+
+    def popitem(self):
+        item = dict.popitem(self)
+        self._changed()
+        return item
+
+    def setdefault(self, key, default=None):
+        value = dict.setdefault(self, key, default)
+        self._changed()
+        return value
+
+    def update(self, *args, **kwargs):
+        dict.update(self, *args, **kwargs)
+        self._changed()
+
+
+class _LayeredMapping(collections.abc.Mapping):
+    """A read-only view of a decoded section and the layers over and under it, which caches the resolved keys.
+
+    maps lists the override layers, the section and the default layers, in lookup order, as collections.ChainMap
+    does; it is shared with the ChainMap, so changing it changes the lookup.
+
+    """
+
+    def __init__(self, section, overrides=(), defaults=()):
+        self.section = section
+        self._chain = collections.ChainMap(*(list(overrides) + [section] + list(defaults)))
+        self.maps = self._chain.maps
+        self._resolved = {}
+        self._dict = None
+
+    def layers(self):
+        """Returns the override layers and the default layers, as a pair of lists."""
+
+        index = next(index for index, values in enumerate(self.maps) if values is self.section)
+        return self.maps[:index], self.maps[index + 1:]
+
+    def invalidate(self):
+        self._resolved = {}
+        self._dict = None
+
+    def to_dict(self):
+        """Returns the resolved keys and values as a dict, built once until invalidate() is called."""
+
+        if self._dict is None:
+            self._dict = dict(self._chain)
+        return self._dict
+
+    def __getitem__(self, key):
+        try:
+            value = self._resolved[key]
+        except KeyError:
+            value = self._resolved[key] = self._chain.get(key, _missing)
+        if value is _missing:
+            raise KeyError(key)
+        return value
+
+    def __iter__(self):
+        return iter(self._chain)
+
+    def __len__(self):
+        return len(self._chain)
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, self.maps)
+
+
+def read_env_file(path):
+    """Reads a file of environment variables. See Config.from_env_file() for the format.
+
+    Args:
+        path (string):
+            The path of the file.
+
+    Returns:
+        A dict of variable names to values.
+
+    """
+
+    variables = {}
+    with open(path, 'r', encoding='utf-8') as env_file:
+        for line in env_file:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if line.startswith('export '):
+                line = line[len('export '):].lstrip()
+            name, separator, value = line.partition('=')
+            if not separator:
+                continue
+            value = value.strip()
+            if len(value) >= 2 and value[0] == value[-1] and value[0] in '"\'':
+                value = value[1:-1]
+            variables[name.strip()] = value
+    return variables
+
+
+def _decode_prepared(section, raw, name, strict):
+    """Decodes a section into its stored form, on an executor. See Config._decode_section()."""
+
+    return Config._prepare_section(section, Config.decode(raw, name, strict))
+
+
+def _restore_layer(cls, values, source):
+    """Recreates a ConfigLayer from its pickled values and source."""
+
+    layer = cls(values)
+    layer.source = source
+    return layer
+
+
+def _restore_config(cls, state):
+    """Recreates a Config object from its pickled state. See Config.__getstate__()."""
+
+    config = cls.__new__(cls)
+    config.__setstate__(state)
+    return config
+
+
+def _probe(relationship, index, endpoint, timeout):
+    """Opens, and immediately closes, a TCP connection to a relationship endpoint.
+
+    Returns:
+        ProbeResult
+
+    """
+
+    host = endpoint.get('host') or endpoint.get('ip')
+    port = endpoint.get('port')
+    if not host or not port:
+        return ProbeResult(relationship, index, host, port, False, None, 'No host or port defined.')
+    start = time.monotonic()
+    try:
+        connection = socket.create_connection((host, port), timeout)
+    except (OSError, socket.timeout) as e:
+        return ProbeResult(relationship, index, host, port, False, None, str(e) or e.__class__.__name__)
+    latency = time.monotonic() - start
+    connection.close()
+    return ProbeResult(relationship, index, host, port, True, latency, None)
+
+
+_empty_namespace = types.MappingProxyType({})
+
+"""
+Marks keys that none of the layers of a section define, in the cache of resolved keys.
+"""
+_missing = object()
+
+
+"""
+Matches a start command that runs uWSGI, whose -p option is the number of processes rather than a port.
+"""
+_uwsgi_command = re.compile(r'(?:^|[\s/])uwsgi(?:\s|$)')
+
+
+def _command_option(command, names):
+    """Returns the integer value of the first of the given options in a command line, or None.
+
+    Both '--option value' and '--option=value' are recognized.
+
+    """
+
+    for name in names:
+        match = re.search(r'(?:^|\s){}(?:=|\s+)(\d+)(?=\s|$)'.format(re.escape(name)), command)
+        if match:
+            return int(match.group(1))
+    return None
+
+
+def _keyed_section(section, data):
+    """Flattens a decoded section into a dict keyed the way diff() reports changes."""
+
+    if section == 'routes':
+        return {route.get('id') or url: route for url, route in data.items()}
+    if section == 'relationships':
+        return {(name, index): endpoint for name, endpoints in data.items()
+                for index, endpoint in enumerate(endpoints)}
+    return data
+
+
+def _same_entry(section, old, new):
+    """Compares two entries of a section, ignoring the 'url' key get_route() adds to routes."""
+
+    if old == new:
+        return True
+    if section == 'routes':
+        return {k: v for k, v in old.items() if k != 'url'} == {k: v for k, v in new.items() if k != 'url'}
+    return False
+
+
+def _deep_size(value, seen):
+    """Returns the size of a decoded JSON value and everything it references, skipping objects in `seen`."""
+
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for key, item in value.items():
+            size += _deep_size(key, seen) + _deep_size(item, seen)
+    elif isinstance(value, list):
+        for item in value:
+            size += _deep_size(item, seen)
+    return size
+
+
+def _intern_strings(value):
+    """Interns, in place, every string value of a decoded JSON value.
+
+    Only values are replaced, one at a time, so readers on other threads never see a key missing. Keys are left
+    alone: the JSON parser already shares repeated keys within a document.
+    """
+
+    if isinstance(value, dict):
+        for key, item in list(value.items()):
+            interned = sys.intern(item) if isinstance(item, str) else _intern_strings(item)
+            if interned is not item:
+                value[key] = interned
+    elif isinstance(value, list):
+        for index, item in enumerate(value):
+            interned = sys.intern(item) if isinstance(item, str) else _intern_strings(item)
+            if interned is not item:
+                value[index] = interned
+    return value
+
+
+def _share(value, memo):
+    """Deduplicates a decoded JSON value against previously seen ones.
+
+    Containers are canonicalized bottom-up: once all the children of a dict or list are canonical objects, two
+    structurally identical containers have children with the same identities, so a container's signature can use
+    the ids of its children. Strings are interned.
+
+    Args:
+        value:
+            A decoded JSON value. Dicts and lists are updated in place.
+        memo (dict):
+            Signatures of the canonical containers seen so far, mapped to the containers (which keeps them alive,
+            and their ids unique).
+
+    Returns:
+        The canonical equivalent of value.
+
+    """
+
+    value_type = type(value)
+    if value_type is str:
+        return sys.intern(value)
+    if value_type is dict:
+        signature = []
+        for key, item in value.items():
+            item_type = type(item)
+            if item_type is dict or item_type is list:
+                item = value[key] = _share(item, memo)
+                signature.append((key, id(item)))
+            elif item_type is str:
+                item = value[key] = sys.intern(item)
+                signature.append((key, item))
+            else:
+                signature.append((key, item_type, item))
+        signature = (dict, tuple(signature))
+    elif value_type is list:
+        signature = []
+        for index, item in enumerate(value):
+            item_type = type(item)
+            if item_type is dict or item_type is list:
+                item = value[index] = _share(item, memo)
+                signature.append(id(item))
+            elif item_type is str:
+                item = value[index] = sys.intern(item)
+                signature.append((item,))
+            else:
+                signature.append((item_type, item))
+        signature = (list, tuple(signature))
+    else:
+        return value
+    return memo.setdefault(signature, value)
+
+
+def _encode(value):
+    """Encodes a value the way Platform.sh does, as base64-encoded JSON, using the most compact JSON form.
+
+    Args:
+        value:
+            Any JSON-serializable value.
+
+    Returns:
+        (string) The encoded value.
+
+    """
+
+    return base64.b64encode(json.dumps(value, separators=(',', ':')).encode('utf-8')).decode('ascii')
+
+
+def _json_loads_stdlib(raw):
+    """Parses a UTF-8 encoded JSON document with the json module."""
+
+    if sys.version_info[1] > 5:
+        return json.loads(raw)
+    return json.loads(raw.decode('utf-8'))
+
+
+def _json_loads_orjson(raw):
+    """Parses a UTF-8 encoded JSON document with orjson, without an intermediate str copy.
+
+    orjson is stricter than the json module (for instance on integers wider than 64 bits), so documents it rejects
+    are parsed again with the json module, which then reports the error if there really is one.
+    """
+
+    try:
+        return orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        return _json_loads_stdlib(raw)
+
+
+_json_loads = _json_loads_stdlib if orjson is None else _json_loads_orjson
+
+
+def _b64decode(variable, name=None):
+    """Decodes a base64 string, rejecting anything but the base64 alphabet and surrounding whitespace.
+
+    Args:
+        variable (string|bytes):
+            The base64-encoded value.
+        name (string):
+            The name of the environment variable, used in error messages.
+
+    Returns:
+        (bytes) The decoded value.
+
+    Raises:
+        ConfigDecodeException:
+            If the value is not valid base64.
+
+    """
+
+    try:
+        return base64.b64decode(variable, validate=True)
+    except (binascii.Error, ValueError):
+        pass
+
+    # Slow path, only taken for wrapped input (e.g. base64.encodebytes) or on error.
+    if isinstance(variable, str):
+        try:
+            variable = variable.encode('ascii')
+        except UnicodeEncodeError as e:
+            raise ConfigDecodeException(name, e.start, 'non-ASCII character in base64 data')
+    compact = b''.join(variable.split())
+    for offset, byte in enumerate(compact):
+        if byte not in _BASE64_ALPHABET:
+            raise ConfigDecodeException(name, offset, 'invalid base64 character {!r}'.format(chr(byte)))
+    if len(compact) % 4:
+        raise ConfigDecodeException(name, len(compact), 'invalid base64 padding (length {} is not a multiple of 4)'
+                                    .format(len(compact)))
+    try:
+        return base64.b64decode(compact, validate=True)
+    except binascii.Error as e:
+        raise ConfigDecodeException(name, None, 'invalid base64: {}'.format(e))
+
+
+_BASE64_ALPHABET = frozenset(b'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/=')
+
+
+class ConfigDecodeException(ValueError):
+    """Raised when an encoded Platform.sh variable is not valid base64-encoded JSON.
+
+    Attributes:
+        variable (string):
+            The name of the environment variable, if known.
+        offset (int):
+            The offset of the error within the base64 data, or within the decoded JSON document for JSON errors.
+            None if unknown.
+        reason (string):
+            A description of what is wrong.
+
+    """
+
+    def __init__(self, variable, offset, reason):
+        self.variable = variable
+        self.offset = offset
+        self.reason = reason
+        super(ConfigDecodeException, self).__init__('Could not decode {}{}: {}'.format(
+            variable or 'variable',
+            '' if offset is None else ' at offset {}'.format(offset),
+            reason
+        ))
+
+    def __reduce__(self):
+        return self.__class__, (self.variable, self.offset, self.reason)
+
+
+def redis_formatter(credentials):
+    """
+    Returns a URL for a Redis connection, suitable for redis.from_url().
+
+    Args:
+        credentials (dict):
+            The credentials dictionary from the relationships.
+
+    Returns:
+        (string) A formatted Redis URL.
+    """
+
+    return _url('redis', credentials)
+
+
+def mysql_formatter(credentials):
+    """
+    Returns a URL for a MySQL or MariaDB connection.
+
+    Args:
+        credentials (dict):
+            The credentials dictionary from the relationships.
+
+    Returns:
+        (string) A formatted MySQL URL.
+    """
+
+    return _url('mysql', credentials)
+
+
+def sqlalchemy_formatter(credentials):
+    """
+    Returns an SQLAlchemy database URL for a MySQL/MariaDB or PostgreSQL relationship.
+
+    Args:
+        credentials (dict):
+            The credentials dictionary from the relationships.
+
+    Returns:
+        (string) A formatted SQLAlchemy URL.
+    """
+
+    return _url(_sqlalchemy_dialects.get(credentials['scheme'], credentials['scheme']), credentials)
+
+
+def elasticsearch_formatter(credentials):
+    """
+    Returns a host URL for an Elasticsearch or OpenSearch connection.
+
+    Args:
+        credentials (dict):
+            The credentials dictionary from the relationships.
+
+    Returns:
+        (string) A formatted Elasticsearch URL.
+    """
+
+    return _url(credentials.get('scheme') or 'http', credentials, with_path=False)
+
+
+def amqp_formatter(credentials):
+    """
+    Returns an AMQP URL for a RabbitMQ connection.
+
+    Args:
+        credentials (dict):
+            The credentials dictionary from the relationships.
+
+    Returns:
+        (string) A formatted AMQP URL.
+    """
+
+    return _url('amqp', credentials)
+
+
+def memcached_formatter(credentials):
+    """
+    Returns a host:port server address for a Memcached connection.
+
+    Args:
+        credentials (dict):
+            The credentials dictionary from the relationships.
+
+    Returns:
+        (string) A formatted Memcached server address.
+    """
+
+    return '{0}:{1}'.format(credentials['host'], credentials['port'])
+
+
+def kafka_formatter(endpoints):
+    """
+    Returns the bootstrap server list for a Kafka connection, covering every entry of the relationship.
+
+    Args:
+        endpoints (list):
+            The list of credentials dictionaries of the relationship.
+
+    Returns:
+        (string) A comma-separated list of host:port pairs.
+    """
+
+    return ','.join('{0}:{1}'.format(endpoint['host'], endpoint['port']) for endpoint in endpoints)
+
+
+kafka_formatter.all_endpoints = True
+
+_sqlalchemy_dialects = {
+    'mysql': 'mysql+pymysql',
+    'pgsql': 'postgresql',
+}
+
+
+def _url(scheme, credentials, with_path=True):
+    """Builds a service URL from relationship credentials, quoting the user name and password."""
+
+    auth = ''
+    if credentials.get('username') or credentials.get('password'):
+        auth = quote(credentials.get('username') or '', safe='')
+        if credentials.get('password'):
+            auth += ':' + quote(credentials['password'], safe='')
+        auth += '@'
+    path = credentials.get('path') if with_path else None
+    return '{0}://{1}{2}:{3}{4}'.format(scheme, auth, credentials['host'], credentials['port'],
+                                        '/' + path if path else '')
+
+
+Config._credentialFormatters.update({
+    'pymongo': pymongo_formatter,
+    'pysolr': pysolr_formatter,
+    'postgresql_dsn': posgresql_dsn_formatter,
+    'redis': redis_formatter,
+    'mysql': mysql_formatter,
+    'sqlalchemy': sqlalchemy_formatter,
+    'elasticsearch': elasticsearch_formatter,
+    'amqp': amqp_formatter,
+    'memcached': memcached_formatter,
+    'kafka': kafka_formatter,
+})
+
+
 class BuildTimeVariableAccessException(RuntimeError):
     pass
 
@@ -644,3 +2398,7 @@ class NoCredentialFormatterFoundException(ValueError):
 
 class NotValidPlatformException(RuntimeError):
     pass
+
+
+class SectionNotLoadedException(RuntimeError):
+    pass
@@ -0,0 +1,299 @@
+"""Framework settings built from the Platform.sh configuration.
+
+Each function resolves all the settings it returns in a single pass over the decoded relationships and routes. The
+result is cached per configuration fingerprint, in memory and optionally on disk, so re-importing a settings module
+(management commands, the autoreloader) does not decode the environment again:
+
+    # settings.py
+    from platformshconfig.integrations import django_settings
+
+    globals().update(django_settings(cache_dir='/tmp/settings-cache'))
+
+Settings are returned as shared, cached dicts; treat them as read-only. The cache files hold credentials: they are
+written only readable by the current user, in a directory created private if it does not exist, and files owned by
+another user or readable by others are ignored.
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+
+try:
+    from urllib.parse import urlparse
+except ImportError:  # pragma: no cover
+    from urlparse import urlparse
+
+from .config import Config
+from .config import BuildTimeVariableAccessException
+from .config import NotValidPlatformException
+
+__all__ = [
+    "django_settings",
+    "flask_settings",
+    "clear_cache"
+]
+
+"""
+Django database backends and cache backends, by built-in formatter name (see Config.formatted_credentials()).
+"""
+_django_database_engines = {
+    "mysql": "django.db.backends.mysql",
+    "postgresql_dsn": "django.db.backends.postgresql"
+}
+_django_cache_backends = {
+    "redis": "django.core.cache.backends.redis.RedisCache",
+    "memcached": "django.core.cache.backends.memcached.PyMemcacheCache"
+}
+
+"""
+Flask-Caching cache types, by built-in formatter name.
+"""
+_flask_cache_types = {
+    "redis": "RedisCache",
+    "memcached": "MemcachedCache"
+}
+
+"""
+The sections the settings are built from.
+"""
+_sections = frozenset(["relationships", "routes"])
+
+"""
+Resolved settings, keyed on the function, the configuration fingerprint and the function arguments.
+"""
+_cache = {}
+
+
+def django_settings(config=None, database=None, cache=None, cache_dir=None):
+    """Builds Django DATABASES, CACHES and ALLOWED_HOSTS settings.
+
+    Only the settings that can be derived from the environment are included: DATABASES if there is a MySQL/MariaDB
+    or PostgreSQL relationship, CACHES if there is a Redis or Memcached relationship, and ALLOWED_HOSTS (the host
+    names of the upstream routes of the current application) at runtime.
+
+    Args:
+        config (Config|None):
+            The configuration to read. Defaults to the current environment, which is then only decoded on a cache
+            miss.
+        database (string|None):
+            The relationship to use as the 'default' database. Defaults to the 'database' relationship if it is a
+            database, else the first one by name. Other database relationships are keyed by relationship name.
+        cache (string|None):
+            The relationship to use as the 'default' cache, chosen like the database.
+        cache_dir (string|None):
+            A directory in which to also cache the result across processes. It is created only accessible by the
+            current user if it does not exist. The file is only readable by the current user, as it contains
+            credentials, and is not trusted otherwise. Defaults to None.
+
+    Returns:
+        A dict of setting names to values.
+
+    """
+
+    return _cached('django', _build_django_settings, config, (database, cache), cache_dir)
+
+
+def flask_settings(config=None, database=None, cache=None, cache_dir=None):
+    """Builds Flask-SQLAlchemy and Flask-Caching settings.
+
+    The result contains SQLALCHEMY_DATABASE_URI if there is a MySQL/MariaDB or PostgreSQL relationship, and
+    CACHE_TYPE with CACHE_REDIS_URL or CACHE_MEMCACHED_SERVERS if there is a Redis or Memcached relationship.
+
+    Args:
+        config (Config|None):
+            The configuration to read. Defaults to the current environment, which is then only decoded on a cache
+            miss.
+        database (string|None):
+            The database relationship to use, chosen as in django_settings() if not given.
+        cache (string|None):
+            The cache relationship to use, chosen as in django_settings() if not given.
+        cache_dir (string|None):
+            A directory in which to also cache the result across processes. Defaults to None.
+
+    Returns:
+        A dict of setting names to values.
+
+    """
+
+    return _cached('flask', _build_flask_settings, config, (database, cache), cache_dir)
+
+
+def clear_cache():
+    """Forgets the settings resolved in this process. Files written to a cache_dir are left alone."""
+
+    _cache.clear()
+
+
+def _cached(kind, build, config, args, cache_dir):
+    """Returns the settings for a configuration from the memory cache, the file cache, or by building them."""
+
+    probe = config if config is not None else Config.minimal()
+    key = (kind, probe.fingerprint(), probe._varPrefix, probe['APPLICATION_NAME'], probe['ENVIRONMENT']) + args
+    if key in _cache:
+        return _cache[key]
+
+    path = None
+    if cache_dir is not None:
+        path = os.path.join(cache_dir, 'platformshconfig-{}-{}.json'.format(kind, _file_key(key)))
+        settings = _read_private(path)
+        if settings is not None:
+            _cache[key] = settings
+            return settings
+
+    if config is None or not _sections <= config._sections:
+        # The key does not depend on the sections loaded, so build from the same environment with all of them.
+        config = Config(probe._environmentVariables, probe._varPrefix, sections=_sections)
+    settings = build(config, *args)
+    _cache[key] = settings
+
+    if path is not None:
+        _write_private(path, settings)
+    return settings
+
+
+def _build_django_settings(config, database, cache):
+    databases, caches = _classify(config)
+    settings = {}
+
+    if databases:
+        settings['DATABASES'] = {}
+        for alias, (name, formatter, credentials) in _with_default(databases, database, 'database'):
+            settings['DATABASES'][alias] = {
+                'ENGINE': _django_database_engines[formatter],
+                'NAME': credentials.get('path'),
+                'USER': credentials.get('username'),
+                'PASSWORD': credentials.get('password'),
+                'HOST': credentials.get('host'),
+                'PORT': credentials.get('port'),
+            }
+    if caches:
+        settings['CACHES'] = {}
+        for alias, (name, formatter, credentials) in _with_default(caches, cache, 'cache'):
+            settings['CACHES'][alias] = {
+                'BACKEND': _django_cache_backends[formatter],
+                'LOCATION': config.formatted_credentials(name, formatter),
+            }
+
+    hosts = _allowed_hosts(config)
+    if hosts is not None:
+        settings['ALLOWED_HOSTS'] = hosts
+    return settings
+
+
+def _build_flask_settings(config, database, cache):
+    databases, caches = _classify(config)
+    settings = {}
+
+    if databases:
+        name = _with_default(databases, database, 'database')[0][1][0]
+        settings['SQLALCHEMY_DATABASE_URI'] = config.formatted_credentials(name, 'sqlalchemy')
+    if caches:
+        name, formatter, credentials = _with_default(caches, cache, 'cache')[0][1]
+        settings['CACHE_TYPE'] = _flask_cache_types[formatter]
+        if formatter == 'redis':
+            settings['CACHE_REDIS_URL'] = config.formatted_credentials(name, formatter)
+        else:
+            settings['CACHE_MEMCACHED_SERVERS'] = [
+                config._credentialFormatters[formatter](endpoint) for endpoint in config.all_credentials(name)
+            ]
+    return settings
+
+
+def _classify(config):
+    """Splits the relationships into databases and caches, in one pass.
+
+    Returns:
+        Two lists of (relationship, formatter name, credentials) tuples, sorted by relationship name.
+
+    """
+
+    databases = []
+    caches = []
+    try:
+        relationships = config.relationships()
+    except (BuildTimeVariableAccessException, NotValidPlatformException):
+        return databases, caches
+    for name in sorted(relationships):
+        credentials = config.credentials(name)
+        formatter = config._default_formatter(credentials)
+        if formatter in _django_database_engines:
+            databases.append((name, formatter, credentials))
+        elif formatter in _django_cache_backends:
+            caches.append((name, formatter, credentials))
+    return databases, caches
+
+
+def _with_default(candidates, requested, conventional):
+    """Orders candidates as (alias, candidate) pairs with the chosen one first, aliased 'default'.
+
+    Raises:
+        KeyError:
+            If the requested relationship is not among the candidates.
+
+    """
+
+    names = [candidate[0] for candidate in candidates]
+    if requested is not None and requested not in names:
+        raise KeyError('Relationship {} is not a supported service for this setting.'.format(requested))
+    chosen = requested if requested is not None else (conventional if conventional in names else names[0])
+    ordered = [('default', candidates[names.index(chosen)])]
+    ordered.extend((candidate[0], candidate) for candidate in candidates if candidate[0] != chosen)
+    return ordered
+
+
+def _allowed_hosts(config):
+    """Returns the host names of the upstream routes for the current application, or None outside of runtime."""
+
+    if not config.in_runtime():
+        return None
+    try:
+        routes = config.get_upstream_routes(config['APPLICATION_NAME'])
+    except NotValidPlatformException:
+        return None
+    return sorted({urlparse(url).hostname for url in routes})
+
+
+def _file_key(key):
+    return hashlib.sha256(repr(key).encode('utf-8')).hexdigest()[:32]
+
+
+def _read_private(path):
+    """Reads settings written by _write_private().
+
+    Returns:
+        The settings, or None if the file is missing or invalid, or could have been written by another user: it is a
+        symbolic link, is owned by someone else, or is accessible by the group or others.
+
+    """
+
+    try:
+        fd = os.open(path, os.O_RDONLY | getattr(os, 'O_NOFOLLOW', 0))
+    except (OSError, IOError):
+        return None
+    with os.fdopen(fd) as f:
+        stat = os.fstat(f.fileno())
+        if hasattr(os, 'getuid') and (stat.st_uid != os.getuid() or stat.st_mode & 0o077):
+            return None
+        try:
+            settings = json.load(f)
+        except ValueError:
+            return None
+    return settings if isinstance(settings, dict) else None
+
+
+def _write_private(path, settings):
+    """Atomically writes settings to a file only the current user can read. Failures are ignored."""
+
+    temporary = None
+    try:
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory, 0o700)
+        fd, temporary = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix='.platformshconfig-')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(settings, f)
+        os.replace(temporary, path)
+    except (OSError, IOError):
+        if temporary is not None and os.path.exists(temporary):
+            os.remove(temporary)
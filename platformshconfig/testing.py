@@ -0,0 +1,234 @@
+"""Generators of valid Platform.sh environments, for tests and benchmarks.
+
+The generated environments have the structure Platform.sh uses, at any size: many routes, replicated (multi-index)
+relationships, namespaced variables and deep application definitions. Generation is deterministic for a given seed.
+
+    from platformshconfig import Config
+    from platformshconfig.testing import generate_environment
+
+    config = Config(generate_environment(routes=1000, replicas=3, seed=1))
+
+"""
+
+import json
+import base64
+import random
+
+__all__ = [
+    "SERVICES",
+    "encode",
+    "generate_sections",
+    "generate_environment"
+]
+
+"""
+The services relationships can be generated for. The key is the relationship name, the value is the scheme, the
+service type and the port.
+"""
+SERVICES = {
+    "database": ("mysql", "mariadb:10.4", 3306),
+    "postgresql": ("pgsql", "postgresql:12", 5432),
+    "mongodb": ("mongodb", "mongodb:3.6", 27017),
+    "redis": ("redis", "redis:6.0", 6379),
+    "memcached": ("memcached", "memcached:1.6", 11211),
+    "elasticsearch": ("http", "elasticsearch:7.9", 9200),
+    "solr": ("solr", "solr:8.0", 8080),
+    "rabbitmq": ("amqp", "rabbitmq:3.8", 5672),
+    "kafka": ("kafka", "kafka:2.7", 9092),
+}
+
+"""
+The namespaces generated variables are spread over. The empty namespace produces variables without a prefix.
+"""
+_variable_namespaces = ['env', 'django', 'php', 'app', '']
+
+
+def encode(value):
+    """Encodes a value as Platform.sh does: base64-encoded JSON.
+
+    Args:
+        value:
+            Any JSON-serializable value.
+
+    Returns:
+        (string) The encoded value.
+
+    """
+
+    return base64.b64encode(json.dumps(value).encode('utf-8')).decode('ascii')
+
+
+def generate_sections(routes=3, relationships=None, replicas=1, variables=1, application_depth=1, app_name='app',
+                      seed=None):
+    """Generates decoded routes, relationships, variables and application definition.
+
+    Args:
+        routes (int):
+            The number of routes. Every third route is a redirect; the others point to the application. The first
+            upstream route is primary, and upstream routes have the IDs 'route0', 'route1'... Defaults to 3.
+        relationships (iterable|None):
+            The relationship names, from SERVICES. Defaults to all of them.
+        replicas (int):
+            The number of entries per relationship. The first one is flagged is_master. Defaults to 1.
+        variables (int):
+            The number of variables, spread over the 'env', 'django', 'php', 'app' and no namespace. Defaults to 1.
+        application_depth (int):
+            The depth of the nested 'web.locations' tree added to the application definition. Defaults to 1.
+        app_name (string):
+            The application name. Defaults to 'app'.
+        seed:
+            The seed of the random generator used for host names, passwords and values. Defaults to None.
+
+    Returns:
+        A dict with the keys 'routes', 'relationships', 'variables' and 'application'.
+
+    """
+
+    rng = random.Random(seed)
+    relationships = sorted(SERVICES) if relationships is None else list(relationships)
+
+    return {
+        'routes': _routes(routes, app_name),
+        'relationships': {name: _endpoints(name, replicas, rng) for name in relationships},
+        'variables': _variables(variables, rng),
+        'application': _application(app_name, relationships, application_depth),
+    }
+
+
+def generate_environment(routes=3, relationships=None, replicas=1, variables=1, application_depth=1, app_name='app',
+                         runtime=True, prefix='PLATFORM_', seed=None, sections=None):
+    """Generates a complete, encoded Platform.sh environment.
+
+    The arguments not listed here are those of generate_sections().
+
+    Args:
+        runtime (bool):
+            Whether to generate a runtime environment. A build environment has no routes, relationships or
+            runtime-only variables. Defaults to True.
+        prefix (string):
+            The prefix for environment variables. Defaults to 'PLATFORM_'.
+        sections (dict|None):
+            Already generated sections, as returned by generate_sections(), to encode instead of generating new
+            ones.
+
+    Returns:
+        A dict of environment variable names to string values.
+
+    """
+
+    if sections is None:
+        sections = generate_sections(routes, relationships, replicas, variables, application_depth, app_name, seed)
+
+    env = {
+        prefix + 'APPLICATION_NAME': app_name,
+        prefix + 'APP_DIR': '/app',
+        prefix + 'PROJECT': 'test-project',
+        prefix + 'TREE_ID': 'abc123',
+        prefix + 'PROJECT_ENTROPY': 'def789',
+        prefix + 'VARIABLES': encode(sections['variables']),
+        prefix + 'APPLICATION': encode(sections['application']),
+    }
+    if runtime:
+        env.update({
+            prefix + 'BRANCH': 'main',
+            prefix + 'ENVIRONMENT': 'main-abc123',
+            prefix + 'DOCUMENT_ROOT': '/app/web',
+            prefix + 'SMTP_HOST': '1.2.3.4',
+            prefix + 'ROUTES': encode(sections['routes']),
+            prefix + 'RELATIONSHIPS': encode(sections['relationships']),
+            'PORT': '8888',
+            'SOCKET': 'unix://tmp/app.sock',
+        })
+    return env
+
+
+def _routes(count, app_name):
+    routes = {}
+    for index in range(count):
+        url = 'https://site{}.main-abc123.eu-3.platformsh.site/'.format(index)
+        route = {
+            'original_url': 'https://site{}.{{default}}/'.format(index),
+            'attributes': {},
+            'restrict_robots': False,
+            'primary': False,
+            'tls': {
+                'client_authentication': None,
+                'min_version': None,
+                'client_certificate_authorities': [],
+                'strict_transport_security': {'include_subdomains': None, 'enabled': None, 'preload': None},
+            },
+            'http_access': {'addresses': [], 'basic_auth': {}},
+        }
+        if index % 3 == 2:
+            route.update(type='redirect', id=None, to='https://site0.main-abc123.eu-3.platformsh.site/')
+        else:
+            route.update(
+                type='upstream',
+                id='route{}'.format(index),
+                primary=index == 0,
+                upstream='{}:http'.format(app_name),
+                cache={'enabled': True, 'headers': ['Accept', 'Accept-Language'], 'cookies': ['*'],
+                       'default_ttl': 0},
+                ssi={'enabled': False},
+            )
+        routes[url] = route
+    return routes
+
+
+def _endpoints(name, replicas, rng):
+    scheme, service_type, port = SERVICES[name]
+    password = '{:016x}'.format(rng.getrandbits(64))
+    endpoints = []
+    for index in range(replicas):
+        host = '{}{}.internal'.format(name, index) if replicas > 1 else '{}.internal'.format(name)
+        endpoints.append({
+            'scheme': scheme,
+            'type': service_type,
+            'service': name,
+            'rel': name,
+            'cluster': 'abcdefgh-main-abc123',
+            'host': host,
+            'hostname': '{:026x}.{}.service._.eu-3.platformsh.site'.format(rng.getrandbits(104), name),
+            'ip': '169.254.{}.{}'.format(rng.randint(0, 255), rng.randint(1, 254)),
+            'port': port,
+            'username': 'main' if scheme in ('mysql', 'pgsql', 'mongodb', 'amqp') else None,
+            'password': password if scheme in ('mysql', 'pgsql', 'mongodb', 'amqp') else None,
+            'path': 'main' if scheme in ('mysql', 'pgsql', 'mongodb', 'solr') else None,
+            'query': {'is_master': index == 0},
+            'fragment': None,
+            'public': False,
+        })
+    return endpoints
+
+
+def _variables(count, rng):
+    variables = {}
+    for index in range(count):
+        namespace = _variable_namespaces[index % len(_variable_namespaces)]
+        name = 'var{}'.format(index)
+        variables['{}:{}'.format(namespace, name) if namespace else name] = '{:x}'.format(rng.getrandbits(48))
+    return variables
+
+
+def _application(app_name, relationships, depth):
+    locations = {}
+    level = locations
+    for index in range(depth):
+        location = {'root': 'web', 'passthru': True, 'expires': '-1s', 'allow': True, 'scripts': True,
+                    'headers': {}, 'rules': {}}
+        level['/' + '/'.join('level{}'.format(i) for i in range(index + 1))] = location
+        level = location['rules']
+    return {
+        'name': app_name,
+        'type': 'python:3.8',
+        'size': 'AUTO',
+        'disk': 1024,
+        'timezone': None,
+        'mounts': {},
+        'variables': {},
+        'access': {'ssh': 'contributor'},
+        'preflight': {'enabled': True, 'ignored_rules': []},
+        'hooks': {'build': 'set -e\n', 'deploy': 'set -e\n', 'post_deploy': None},
+        'relationships': {name: '{}:{}'.format(name, SERVICES[name][1].split(':')[0]) for name in relationships},
+        'web': {'locations': locations, 'move_to_root': False, 'commands': {'start': 'gunicorn app:app'}},
+    }
@@ -0,0 +1,281 @@
+"""Watches a file of environment variables and publishes updated configuration.
+
+    from platformshconfig.watch import ConfigWatcher
+
+    def on_change(config, sections):
+        if 'relationships' in sections:
+            rebuild_pools(config)
+
+    watcher = ConfigWatcher('/run/app/env', on_change)
+    watcher.start()
+    ...
+    watcher.config  # always the latest Config
+
+On Linux the file's directory is watched with inotify, so nothing happens until the file is written or replaced.
+Elsewhere, or if inotify is not available, the file is polled with stat(), which only re-reads it when its
+modification time, size or inode changed. Either way, only the sections whose encoded variable changed are decoded
+again (see Config.reload()).
+"""
+
+import os
+import errno
+import ctypes
+import select
+import struct
+import logging
+import threading
+import ctypes.util
+
+from .config import Config, read_env_file
+
+__all__ = [
+    "ConfigWatcher"
+]
+
+logger = logging.getLogger(__name__)
+
+"""
+inotify flags, from <sys/inotify.h>.
+"""
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+
+_event_header = struct.Struct('iIII')
+
+
+class ConfigWatcher:
+    """Keeps a Config object up to date with a file of environment variables.
+
+    Attributes:
+        config (Config):
+            The configuration as of the last change.
+
+    """
+
+    def __init__(self, path, callback=None, var_prefix='PLATFORM_', interval=1.0, use_inotify=None, **kwargs):
+        """Reads the file and constructs the initial configuration.
+
+        Args:
+            path (string):
+                The file of environment variables. See Config.from_env_file() for the format.
+            callback (callable|None):
+                A subscriber; see subscribe(). Defaults to None.
+            var_prefix (string):
+                The prefix for environment variables. Defaults to 'PLATFORM_'.
+            interval (float):
+                How often, in seconds, to poll the file when inotify is not used, and how quickly stop() takes
+                effect when it is. Defaults to 1.0.
+            use_inotify (bool|None):
+                Whether to use inotify. Defaults to None, which uses it if available. The inotify instance is only
+                opened by start(), and closed by stop().
+            **kwargs:
+                Other arguments of the Config constructor (strict, sections...).
+
+        """
+
+        self.path = os.path.abspath(path)
+        self.interval = interval
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopping = threading.Event()
+        self._inotify = None
+        self._useInotify = _Inotify.available() if use_inotify or use_inotify is None else False
+        if use_inotify and not self._useInotify:
+            raise OSError(errno.ENOSYS, 'inotify is not available')
+
+        self._signature = self._stat()
+        self._environment = read_env_file(self.path)
+        self.config = Config(dict(self._environment), var_prefix, **kwargs)
+        if callback is not None:
+            self.subscribe(callback)
+
+    def subscribe(self, callback):
+        """Registers a function to call when the configuration changes.
+
+        Args:
+            callback (callable):
+                Called with the new Config object and the list of encoded sections ('routes', 'relationships',
+                'variables', 'application') that changed. The list is empty if only plain variables changed.
+
+        Returns:
+            ConfigWatcher. The called object, for chaining.
+
+        """
+
+        self._subscribers.append(callback)
+        return self
+
+    def check(self):
+        """Reloads the configuration if the file changed, and notifies the subscribers.
+
+        This is what the background thread calls; it can also be called directly instead of start().
+
+        Returns:
+            list|None: The sections that changed, or None if the configuration did not change.
+
+        """
+
+        with self._lock:
+            signature = self._stat()
+            if signature == self._signature:
+                return None
+            self._signature = signature
+            try:
+                environment = read_env_file(self.path)
+            except (IOError, OSError) as e:
+                logger.warning('Could not read %s: %s', self.path, e)
+                return None
+            if environment == self._environment:
+                return None
+
+            previous = self.config
+            config = previous.reload(dict(environment))
+            self._environment = environment
+            self.config = config
+
+        changed = [section for section in sorted(previous._allSections)
+                   if previous.fingerprint(section) != config.fingerprint(section)]
+        for callback in list(self._subscribers):
+            try:
+                callback(config, changed)
+            except Exception:
+                logger.exception('Configuration subscriber %r failed', callback)
+        return changed
+
+    def start(self):
+        """Starts watching the file in a daemon thread.
+
+        Returns:
+            ConfigWatcher. The called object, for chaining.
+
+        """
+
+        if self._thread is None:
+            if self._useInotify:
+                self._inotify = _Inotify.create()
+                if self._inotify is None:
+                    logger.warning('Could not create an inotify instance, polling %s instead', self.path)
+                    self._useInotify = False
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name='platformshconfig-watcher')
+            self._thread.daemon = True
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stops the background thread, and releases the inotify watch."""
+
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @property
+    def uses_inotify(self):
+        """bool: Whether the file is watched with inotify rather than polled."""
+
+        return self._useInotify
+
+    def _run(self):
+        if self._inotify is not None:
+            self._inotify.add_watch(os.path.dirname(self.path))
+        name = os.path.basename(self.path)
+        while not self._stopping.is_set():
+            if self._inotify is not None:
+                if name not in self._inotify.read(self.interval):
+                    continue
+            elif self._stopping.wait(self.interval):
+                break
+            try:
+                self.check()
+            except Exception:
+                logger.exception('Could not reload %s', self.path)
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+class _Inotify:
+    """A minimal ctypes binding to the Linux inotify API."""
+
+    def __init__(self, libc, fd):
+        self._libc = libc
+        self.fd = fd
+
+    @classmethod
+    def available(cls):
+        """Returns whether inotify is available on this system."""
+
+        inotify = cls.create()
+        if inotify is None:
+            return False
+        inotify.close()
+        return True
+
+    @classmethod
+    def create(cls):
+        """Returns an inotify instance, or None if inotify is not available on this system."""
+
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or None, use_errno=True)
+            init = libc.inotify_init1
+        except (OSError, AttributeError):
+            return None
+        fd = init(_IN_NONBLOCK | _IN_CLOEXEC)
+        if fd < 0:
+            return None
+        return cls(libc, fd)
+
+    def add_watch(self, directory):
+        """Watches a directory for files being written, created or moved into it."""
+
+        mask = _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE | _IN_MODIFY
+        if self._libc.inotify_add_watch(self.fd, os.fsencode(directory), mask) < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error), directory)
+
+    def read(self, timeout):
+        """Waits up to timeout seconds for events.
+
+        Returns:
+            set: The names of the files the events were about.
+
+        """
+
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+        names = set()
+        offset = 0
+        while offset + _event_header.size <= len(data):
+            wd, mask, cookie, length = _event_header.unpack_from(data, offset)
+            offset += _event_header.size
+            names.add(os.fsdecode(data[offset:offset + length].rstrip(b'\0')))
+            offset += length
+        return names
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
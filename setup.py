@@ -45,6 +45,14 @@ setup(
     long_description_content_type="text/markdown",
     packages=find_packages(),
     tests_require=['pytest'],
+    extras_require={
+        'speedups': ['orjson; python_version >= "3.6"'],
+    },
+    entry_points={
+        'console_scripts': [
+            'platformshconfig = platformshconfig.cli:main',
+        ],
+    },
     classifiers=[
         'Development Status :: 5 - Production/Stable',
         'License :: OSI Approved :: MIT License',
@@ -0,0 +1,58 @@
+"""Mock Platform.sh environments shared by the test modules."""
+
+import os
+import json
+import base64
+
+from copy import deepcopy
+
+
+def load_json_file(name):
+
+    data_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'valid', '{}.json'.format(name))
+    with open(data_path, 'r') as read_file:
+        return json.load(read_file)
+
+
+def encode(value):
+
+    return base64.b64encode(json.dumps(value).encode('utf-8'))
+
+
+def mock_environments():
+    """Returns new mock environments simulating build time and runtime, as a (build, deploy) pair."""
+
+    env = load_json_file('ENV')
+
+    for item in ['PLATFORM_APPLICATION', 'PLATFORM_VARIABLES']:
+        env[item] = encode(load_json_file(item))
+
+    build = deepcopy(env)
+
+    # These sub-values are always encoded
+
+    for item in ['PLATFORM_ROUTES', 'PLATFORM_RELATIONSHIPS']:
+        env[item] = encode(load_json_file(item))
+
+    env.update(load_json_file('ENV_runtime'))
+    return build, env
+
+
+def environment_with_services(env):
+    """Adds PostgreSQL, Redis, RabbitMQ, Memcached and (two-node) Kafka relationships to a runtime environment."""
+
+    relationships = load_json_file('PLATFORM_RELATIONSHIPS')
+    endpoint = {'username': None, 'password': None, 'path': None, 'query': {}}
+    relationships.update({
+        'postgresql': [dict(endpoint, scheme='pgsql', type='postgresql:12', host='postgresql.internal',
+                            port=5432, username='main', password='s3cret', path='main')],
+        'redis': [dict(endpoint, scheme='redis', type='redis:6.0', host='redis.internal', port=6379)],
+        'rabbitmq': [dict(endpoint, scheme='amqp', type='rabbitmq:3.8', host='rabbitmq.internal', port=5672,
+                          username='guest', password='p@ss/word')],
+        'memcached': [dict(endpoint, scheme='memcached', type='memcached:1.6', host='memcached.internal',
+                           port=11211)],
+        'kafka': [dict(endpoint, scheme='kafka', type='kafka:2.7', host='kafka{}.internal'.format(index),
+                       port=9092) for index in range(2)],
+    })
+    env['PLATFORM_RELATIONSHIPS'] = encode(relationships)
+    return env
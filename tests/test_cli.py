@@ -0,0 +1,108 @@
+import io
+import json
+import unittest
+
+from platformshconfig.cli import main
+
+from . import fixtures
+
+
+class CliTest(unittest.TestCase):
+
+    def setUp(self):
+
+        self.build_environ, self.environ = fixtures.mock_environments()
+
+    def run_cli(self, *argv):
+
+        stdout = io.StringIO()
+        stderr = io.StringIO()
+        status = main(list(argv), self.environ, stdout, stderr)
+        return status, stdout.getvalue(), stderr.getvalue()
+
+    def test_dump_routes(self):
+
+        status, out, err = self.run_cli('routes')
+
+        self.assertEqual(0, status)
+        routes = json.loads(out)
+        self.assertEqual('main', routes['https://www.master-7rqtwti-gcpjkefjk4wc2.us-2.platformsh.site/']['id'])
+
+    def test_dump_every_section(self):
+
+        for section in ['application', 'relationships', 'routes', 'variables']:
+            with self.subTest(section=section):
+                status, out, err = self.run_cli(section)
+
+                self.assertEqual(0, status, err)
+                self.assertTrue(json.loads(out))
+
+        status, out, err = self.run_cli('relationships')
+        self.assertEqual('database.internal', json.loads(out)['database'][0]['host'])
+
+    def test_dump_every_section_in_build(self):
+
+        self.environ = self.build_environ
+        for section, expected in [('application', 0), ('relationships', 1), ('routes', 1), ('variables', 0)]:
+            with self.subTest(section=section):
+                status, out, err = self.run_cli(section)
+
+                self.assertEqual(expected, status, err)
+                if expected:
+                    self.assertIn('not available during the build phase', err)
+
+    def test_dump_application_compact(self):
+
+        status, out, err = self.run_cli('--compact', 'application')
+
+        self.assertEqual(0, status)
+        self.assertEqual(1, len(out.splitlines()))
+        self.assertEqual('python:3.7', json.loads(out)['type'])
+
+    def test_credentials(self):
+
+        status, out, err = self.run_cli('credentials', 'database')
+
+        self.assertEqual(0, status)
+        self.assertEqual('mysql', json.loads(out)['scheme'])
+
+    def test_formatted_credentials(self):
+
+        status, out, err = self.run_cli('credentials', 'mongodb', '--formatter', 'pymongo')
+
+        self.assertEqual(0, status)
+        self.assertEqual('mongodb.internal:27017/main\n', out)
+
+    def test_missing_relationship_fails(self):
+
+        status, out, err = self.run_cli('credentials', 'missing')
+
+        self.assertEqual(1, status)
+        self.assertIn('No relationship defined: missing', err)
+
+    def test_timing(self):
+
+        status, out, err = self.run_cli('--timing', '--repeat', '1')
+
+        self.assertEqual(0, status)
+        sections = [line.split()[0] for line in out.splitlines()[1:]]
+        self.assertEqual(['application', 'relationships', 'routes', 'variables'], sections)
+
+    def test_timing_goes_to_stderr_with_a_command(self):
+
+        status, out, err = self.run_cli('--timing', '--repeat', '1', 'variables')
+
+        self.assertEqual(0, status)
+        self.assertEqual('someval', json.loads(out)['somevar'])
+        self.assertIn('variables', err)
+
+    def test_no_command_prints_help(self):
+
+        status, out, err = self.run_cli()
+
+        self.assertEqual(2, status)
+        self.assertIn('usage', err)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,149 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from platformshconfig import Config
+from platformshconfig import integrations
+
+from . import fixtures
+
+
+class IntegrationsTest(unittest.TestCase):
+
+    def setUp(self):
+
+        integrations.clear_cache()
+        self.build_environ, self.environ = fixtures.mock_environments()
+
+    def test_django_settings(self):
+
+        config = Config(fixtures.environment_with_services(self.environ))
+
+        settings = integrations.django_settings(config)
+
+        self.assertEqual(['default', 'postgresql'], sorted(settings['DATABASES']))
+        self.assertEqual({
+            'ENGINE': 'django.db.backends.mysql',
+            'NAME': 'main',
+            'USER': 'user',
+            'PASSWORD': '',
+            'HOST': 'database.internal',
+            'PORT': 3306,
+        }, settings['DATABASES']['default'])
+        self.assertEqual('django.db.backends.postgresql', settings['DATABASES']['postgresql']['ENGINE'])
+        self.assertEqual(['default', 'redis'], sorted(settings['CACHES']))
+        self.assertEqual('memcached.internal:11211', settings['CACHES']['default']['LOCATION'])
+        self.assertEqual('redis://redis.internal:6379', settings['CACHES']['redis']['LOCATION'])
+        self.assertEqual(['www.master-7rqtwti-gcpjkefjk4wc2.us-2.platformsh.site',
+                          'www2.master-7rqtwti-gcpjkefjk4wc2.us-2.platformsh.site'], settings['ALLOWED_HOSTS'])
+
+    def test_django_settings_with_explicit_relationships(self):
+
+        config = Config(fixtures.environment_with_services(self.environ))
+
+        settings = integrations.django_settings(config, database='postgresql', cache='redis')
+
+        self.assertEqual('postgresql.internal', settings['DATABASES']['default']['HOST'])
+        self.assertEqual('database.internal', settings['DATABASES']['database']['HOST'])
+        self.assertEqual('django.core.cache.backends.redis.RedisCache', settings['CACHES']['default']['BACKEND'])
+
+        with self.assertRaises(KeyError):
+            integrations.django_settings(config, database='redis')
+
+    def test_django_settings_in_build_has_no_allowed_hosts(self):
+
+        settings = integrations.django_settings(Config(self.build_environ))
+
+        self.assertEqual({}, settings)
+
+    def test_flask_settings(self):
+
+        config = Config(fixtures.environment_with_services(self.environ))
+
+        settings = integrations.flask_settings(config, cache='redis')
+
+        self.assertEqual('mysql+pymysql://user@database.internal:3306/main', settings['SQLALCHEMY_DATABASE_URI'])
+        self.assertEqual('RedisCache', settings['CACHE_TYPE'])
+        self.assertEqual('redis://redis.internal:6379', settings['CACHE_REDIS_URL'])
+
+    def test_settings_are_cached_per_fingerprint(self):
+
+        env = fixtures.environment_with_services(self.environ)
+
+        first = integrations.django_settings(Config(env))
+
+        self.assertIs(first, integrations.django_settings(Config(env)))
+        self.assertIs(first, integrations.django_settings(Config.minimal(env)))
+        self.assertIsNot(first, integrations.django_settings(Config(self.build_environ)))
+
+    def test_minimal_config_does_not_cache_empty_settings(self):
+
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        env = fixtures.environment_with_services(self.environ)
+
+        first = integrations.django_settings(Config.minimal(env), cache_dir=cache_dir)
+        second = integrations.django_settings(Config(env), cache_dir=cache_dir)
+        integrations.clear_cache()
+        from_disk = integrations.django_settings(Config(env), cache_dir=cache_dir)
+
+        self.assertEqual(['ALLOWED_HOSTS', 'CACHES', 'DATABASES'], sorted(first))
+        self.assertIs(first, second)
+        self.assertEqual(first, from_disk)
+
+    def test_settings_are_cached_on_disk(self):
+
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        env = fixtures.environment_with_services(self.environ)
+
+        first = integrations.django_settings(Config(env), cache_dir=cache_dir)
+        integrations.clear_cache()
+        second = integrations.django_settings(Config.minimal(env), cache_dir=cache_dir)
+
+        self.assertEqual(first, second)
+        self.assertIsNot(first, second)
+        (name,) = os.listdir(cache_dir)
+        self.assertEqual(0o600, os.stat(os.path.join(cache_dir, name)).st_mode & 0o777)
+
+    def test_cache_dir_is_created_private(self):
+
+        parent = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, parent)
+        cache_dir = os.path.join(parent, 'settings')
+
+        integrations.django_settings(Config(fixtures.environment_with_services(self.environ)), cache_dir=cache_dir)
+
+        self.assertEqual(0o700, os.stat(cache_dir).st_mode & 0o777)
+        self.assertEqual(1, len(os.listdir(cache_dir)))
+
+    def test_cache_files_others_could_write_are_ignored(self):
+
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        env = fixtures.environment_with_services(self.environ)
+        integrations.django_settings(Config(env), cache_dir=cache_dir)
+        (name,) = os.listdir(cache_dir)
+        path = os.path.join(cache_dir, name)
+        planted = os.path.join(cache_dir, 'planted')
+
+        for mode, symlink in ((0o644, False), (0o620, False), (0o600, True)):
+            with self.subTest(mode=oct(mode), symlink=symlink):
+                with open(planted, 'w') as f:
+                    json.dump({'DATABASES': {'default': {'HOST': 'attacker.example.com'}}}, f)
+                os.chmod(planted, mode)
+                os.remove(path)
+                if symlink:
+                    os.symlink(planted, path)
+                else:
+                    os.rename(planted, path)
+                integrations.clear_cache()
+
+                settings = integrations.django_settings(Config(env), cache_dir=cache_dir)
+
+                self.assertEqual('database.internal', settings['DATABASES']['default']['HOST'])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import pickle
+import random
+import unittest
+
+from platformshconfig import Config
+from platformshconfig.testing import SERVICES, generate_environment, generate_sections
+
+
+class GeneratedEnvironmentTest(unittest.TestCase):
+    """Checks the Config accessors against randomly shaped generated environments."""
+
+    examples = 25
+
+    def shapes(self):
+
+        rng = random.Random(20210203)
+        for seed in range(self.examples):
+            yield {
+                'routes': rng.randint(1, 60),
+                'relationships': rng.sample(sorted(SERVICES), rng.randint(1, len(SERVICES))),
+                'replicas': rng.randint(1, 4),
+                'variables': rng.randint(0, 40),
+                'application_depth': rng.randint(1, 30),
+                'seed': seed,
+            }
+
+    def test_accessors_match_generated_data(self):
+
+        for shape in self.shapes():
+            with self.subTest(**shape):
+                sections = generate_sections(**shape)
+                config = Config(generate_environment(sections=sections))
+
+                self.assertEqual(sections['routes'], config.routes())
+                self.assertEqual(sections['application'], config.application())
+                self.assertEqual(sections['variables'], config.variables())
+                for name, value in sections['variables'].items():
+                    self.assertEqual(value, config.variable(name))
+
+                for url, route in sections['routes'].items():
+                    if route['id']:
+                        self.assertEqual(url, config.get_route(route['id'])['url'])
+                self.assertTrue(config.get_primary_route()['primary'])
+                upstream = [url for url, route in sections['routes'].items() if route['type'] == 'upstream']
+                self.assertEqual(sorted(upstream), sorted(config.get_upstream_routes('app')))
+
+                for name, endpoints in sections['relationships'].items():
+                    self.assertTrue(config.has_relationship(name))
+                    self.assertEqual(endpoints, config.all_credentials(name))
+                    for index, endpoint in enumerate(endpoints):
+                        self.assertEqual(endpoint, config.credentials(name, index))
+                    with self.assertRaises(KeyError):
+                        config.credentials(name, len(endpoints))
+                    self.assertTrue(config.select_credentials(name, 'master')['query']['is_master'])
+                    self.assertTrue(config.formatted_credentials(name))
+
+    def test_round_trips_preserve_generated_data(self):
+
+        for shape in self.shapes():
+            with self.subTest(**shape):
+                config = Config(generate_environment(**shape))
+
+                for other in (pickle.loads(pickle.dumps(config)), Config(config.to_env(compact=True))):
+                    self.assertEqual({}, config.diff(other))
+                    self.assertEqual(config.routes(), other.routes())
+                    self.assertEqual(config.port, other.port)
+
+    def test_generation_is_deterministic(self):
+
+        self.assertEqual(generate_environment(replicas=2, variables=10, seed=1),
+                         generate_environment(replicas=2, variables=10, seed=1))
+
+    def test_build_environment(self):
+
+        config = Config(generate_environment(runtime=False))
+
+        self.assertTrue(config.in_build())
+        self.assertEqual('app', config.applicationName)
+        self.assertEqual('python:3.8', config.application()['type'])
+
+
+if __name__ == "__main__":
+    unittest.main()
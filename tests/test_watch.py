@@ -0,0 +1,113 @@
+import os
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+
+from platformshconfig.testing import generate_environment, generate_sections
+from platformshconfig.watch import ConfigWatcher, _Inotify
+
+
+class ConfigWatcherTest(unittest.TestCase):
+
+    def setUp(self):
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'env')
+        self.sections = generate_sections(routes=5, replicas=2, variables=5, seed=1)
+        self.write(generate_environment(sections=self.sections))
+
+    def write(self, env):
+
+        # Replace the file atomically, as deployment tools do, so the inode changes even within the mtime
+        # resolution of the file system.
+        temporary = self.path + '.tmp'
+        with open(temporary, 'w') as env_file:
+            for name, value in sorted(env.items()):
+                env_file.write("{}='{}'\n".format(name, value))
+        os.replace(temporary, self.path)
+
+    def change_relationships(self):
+
+        self.sections['relationships']['redis'][0]['host'] = 'other.internal'
+        env = generate_environment(sections=self.sections)
+        self.write(env)
+
+    def test_check_without_changes(self):
+
+        watcher = ConfigWatcher(self.path, use_inotify=False)
+
+        self.assertIsNone(watcher.check())
+        self.write(generate_environment(sections=self.sections))
+        self.assertIsNone(watcher.check())
+
+    def test_check_reloads_only_changed_sections(self):
+
+        received = []
+        watcher = ConfigWatcher(self.path, lambda config, sections: received.append((config, sections)),
+                                use_inotify=False)
+        config = watcher.config
+        routes = config.routes()
+
+        self.change_relationships()
+
+        self.assertEqual(['relationships'], watcher.check())
+        self.assertEqual([(watcher.config, ['relationships'])], received)
+        self.assertIsNot(config, watcher.config)
+        self.assertIs(routes, watcher.config.routes())
+        self.assertEqual('other.internal', watcher.config.credentials('redis')['host'])
+
+    def test_failing_subscriber_does_not_stop_the_others(self):
+
+        received = []
+        watcher = ConfigWatcher(self.path, lambda config, sections: 1 / 0, use_inotify=False)
+        watcher.subscribe(lambda config, sections: received.append(sections))
+
+        self.change_relationships()
+        with self.assertLogs('platformshconfig.watch', 'ERROR'):
+            watcher.check()
+
+        self.assertEqual([['relationships']], received)
+
+    def test_thread_notifies_subscribers(self):
+
+        for use_inotify in (False, True):
+            if use_inotify and not _Inotify.available():
+                continue
+            with self.subTest(use_inotify=use_inotify):
+                changed = threading.Event()
+                with ConfigWatcher(self.path, lambda config, sections: changed.set(), interval=0.05,
+                                   use_inotify=use_inotify) as watcher:
+                    self.assertEqual(use_inotify, watcher.uses_inotify)
+                    time.sleep(0.1)
+                    self.change_relationships()
+                    self.assertTrue(changed.wait(5))
+                self.assertEqual('other.internal', watcher.config.credentials('redis')['host'])
+                self.sections = generate_sections(routes=5, replicas=2, variables=5, seed=1)
+                self.write(generate_environment(sections=self.sections))
+
+    def test_inotify_is_only_open_while_started(self):
+
+        if not _Inotify.available():
+            self.skipTest('inotify is not available')
+
+        watcher = ConfigWatcher(self.path, interval=0.05, use_inotify=True)
+        self.assertIsNone(watcher._inotify)
+
+        for attempt in range(2):
+            with self.subTest(attempt=attempt):
+                watcher.start()
+                inotify = watcher._inotify
+                self.assertTrue(watcher.uses_inotify)
+                self.assertIsNotNone(inotify.fd)
+
+                watcher.stop()
+                self.assertIsNone(inotify.fd)
+                self.assertIsNone(watcher._inotify)
+                self.assertTrue(watcher.uses_inotify)
+
+
+if __name__ == "__main__":
+    unittest.main()